@@ -0,0 +1,238 @@
+"""
+Офлайн-бенчмарки ежедневной задачи (сеть не нужна):
+  - парсеры источников на записанных страницах из benchmarks/fixtures
+    (для HTML — на каждом бэкенде, с проверкой, что вывод совпадает);
+  - архив, выбор без повторов и сборка дайджеста на синтетическом
+    архиве и истории отправленного размером --sizes строк;
+  - рассылка send_daily_digest на заглушке бота по --chats чатам.
+
+Результат — таблица CSV (или JSON) в stdout либо в --out, чтобы сравнивать прогоны.
+
+    python -m benchmarks.bench
+    python -m benchmarks.bench --sizes 10000,100000 --chats 5000 --format json --out bench.json
+    python -m benchmarks.bench --only digest --sizes 1000000   # миллион — только явно: долго и гигабайты на диске
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from config_data import config
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# источник -> (файл, функция разбора, бинарный ли вход)
+PARSE_FIXTURES = {
+    "sostav": ("sostav.html", "parse_sostav", False),
+    "vc": ("vc.html", "parse_vc", False),
+    "habr": ("habr.xml", "parse_habr", True),
+    "dsgners": ("dsgners.html", "parse_dsgners", False),
+    "dsgners_news": ("dsgners_news.html", "parse_dsgners", False),
+}
+HTML_BACKENDS = ("html.parser", "lxml")
+
+HOSTS = ("https://vc.ru/design/", "https://habr.com/ru/articles/", "https://www.sostav.ru/publication/", "https://dsgners.ru/articles/")
+
+FIELDS = ("bench", "variant", "n", "repeat", "median_ms", "min_ms", "per_sec", "note")
+
+
+def _row(bench, variant, n, times, note=""):
+    median = statistics.median(times)
+    return {
+        "bench": bench,
+        "variant": variant,
+        "n": n,
+        "repeat": len(times),
+        "median_ms": round(median * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "per_sec": round(n / median, 1) if median > 0 and n else "",
+        "note": note,
+    }
+
+
+def _timed(fn, repeat):
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return times, result
+
+
+def bench_parsers(repeat):
+    from utils import html_backend, parser
+
+    rows = []
+    for name, (fixture, func_name, binary) in PARSE_FIXTURES.items():
+        path = os.path.join(FIXTURES_DIR, fixture)
+        with open(path, "rb" if binary else "r", **({} if binary else {"encoding": "utf-8"})) as f:
+            data = f.read()
+        func = getattr(parser, func_name)
+
+        if binary:
+            times, out = _timed(lambda: func(data), repeat)
+            rows.append(_row(f"parse.{name}", "feedparser", len(out), times))
+            continue
+
+        outputs = {}
+        for backend in HTML_BACKENDS:
+            html_backend.HTML_PARSER = backend
+            try:
+                times, outputs[backend] = _timed(lambda: func(data), repeat)
+            except Exception as e:  # бэкенд не установлен
+                rows.append({"bench": f"parse.{name}", "variant": backend, "note": f"skip: {e}"})
+                continue
+            rows.append(_row(f"parse.{name}", backend, len(outputs[backend]), times))
+        html_backend.HTML_PARSER = html_backend.DEFAULT_BACKEND
+
+        same = len({repr(v) for v in outputs.values()}) <= 1
+        for row in rows[-len(outputs):]:
+            row["note"] = "identical" if same else "MISMATCH"
+    return rows
+
+
+def _use_store(path):
+    from utils import link_store
+
+    link_store.close()
+    config.STORE_PATH = path
+
+
+def _fill_store(size):
+    """Синтетический архив size ссылок (пополам статьи/новости) и история на половину из них."""
+    from utils import link_store
+
+    rnd = random.Random(size)
+    entries = {link_store.ARTICLES: [], link_store.NEWS: []}
+    for i in range(size):
+        link = f"{rnd.choice(HOSTS)}{i}-item"
+        kind = link_store.ARTICLES if i % 2 else link_store.NEWS
+        # случайные «слова», чтобы заголовки не считались почти-дубликатами друг друга
+        title = " ".join("".join(rnd.choices("абвгдежзиклмнопрст", k=7)) for _ in range(6))
+        entries[kind].append((title, link))
+
+    started = time.perf_counter()
+    for kind, items in entries.items():
+        link_store.add_links(items, kind)
+    insert_time = time.perf_counter() - started
+
+    for kind, items in entries.items():
+        link_store.mark_sent(rnd.sample(items, len(items) // 2), kind)
+    return insert_time
+
+
+def bench_digest(sizes, repeat, workdir):
+    from utils import link_store, parser
+
+    rows = []
+    for size in sizes:
+        _use_store(os.path.join(workdir, f"bench_{size}.sqlite3"))
+        insert_time = _fill_store(size)
+        rows.append(_row("store.add_links", "batch", size, [insert_time]))
+
+        times, out = _timed(lambda: link_store.unsent(link_store.ARTICLES), repeat)
+        rows.append(_row("store.unsent", f"archive={size}", len(out), times))
+
+        times, _ = _timed(lambda: parser._pick_random_without_repeats(link_store.ARTICLES, 5), repeat)
+        rows.append(_row("digest.pick", f"archive={size}", 1, times))
+
+        times, _ = _timed(lambda: parser.build_daily_digest(n_each=5), repeat)
+        rows.append(_row("digest.build", f"archive={size}", 1, times))
+    return rows
+
+
+class StubBot:
+    """Заглушка aiogram.Bot: имитирует задержку API и ничего никуда не шлёт."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = 0
+
+    async def _call(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        await self._call()
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="stub-file-id")])
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call()
+        return SimpleNamespace(message_id=self.sent)
+
+
+def bench_fanout(chats, latency, workdir):
+    from utils import broadcast, parser
+    from utils.media_cache import media_cache
+
+    _use_store(os.path.join(workdir, "bench_fanout.sqlite3"))
+    _fill_store(1000)
+    # заглушечные file_id не должны попасть в боевой ./media_cache.json
+    media_cache.cache_file = os.path.join(workdir, "media_cache.json")
+    media_cache._data = {}
+    # меряем сам движок рассылки, а не лимиты Telegram
+    broadcast.GLOBAL_RATE = float("inf")
+
+    bot = StubBot(latency=latency)
+    # каждый десятый подписчик отключил Хабр — два варианта дайджеста
+    subscribers = [
+        (str(100000 + i), frozenset({"habr"}) if i % 10 == 0 else frozenset())
+        for i in range(chats)
+    ]
+
+    started = time.perf_counter()
+    asyncio.run(parser.send_daily_digest(bot, subscribers))
+    elapsed = time.perf_counter() - started
+    return [_row("broadcast.send_daily_digest", f"latency={latency * 1000:.0f}ms", chats, [elapsed])]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10000,100000",
+                    help="размеры синтетического архива через запятую (1000000 — только явно)")
+    ap.add_argument("--chats", type=int, default=10000, help="сколько фейковых чатов в рассылке")
+    ap.add_argument("--latency", type=float, default=0.02, help="задержка заглушки бота на вызов, секунд")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--only", choices=("parse", "digest", "fanout"), action="append")
+    ap.add_argument("--format", choices=("csv", "json"), default="csv")
+    ap.add_argument("--out", help="файл для результата (по умолчанию stdout)")
+    args = ap.parse_args(argv)
+
+    only = set(args.only or ("parse", "digest", "fanout"))
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    rows = []
+    # служебные print() из задачи не должны попадать в таблицу
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        if "parse" in only:
+            rows += bench_parsers(args.repeat)
+        if "digest" in only:
+            rows += bench_digest(sizes, args.repeat, workdir)
+        if "fanout" in only:
+            rows += bench_fanout(args.chats, args.latency, workdir)
+
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    try:
+        if args.format == "json":
+            json.dump(rows, out, ensure_ascii=False, indent=2)
+            out.write("\n")
+        else:
+            writer = csv.DictWriter(out, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
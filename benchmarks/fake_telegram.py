@@ -0,0 +1,197 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных прогонов рассылки.
+Понимает sendMessage, sendPhoto, setWebhook (и отвечает ok на прочие
+служебные методы), умеет:
+  - задержку ответа (--latency, с разбросом --jitter);
+  - глобальный лимит сообщений в секунду: сверх него — 429 с retry_after;
+  - случайные 429 с заданной вероятностью (--flood-ratio);
+  - «заблокировавших бота» пользователей: доля --blocked-ratio чатов
+    всегда получает 403 bot was blocked by the user.
+
+Бот направляется сюда через TELEGRAM_API_URL (см. loader.py).
+
+    python -m benchmarks.fake_telegram --port 8081 --latency 0.05 --rate 30
+"""
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+
+DEFAULT_PORT = 8081
+SEND_METHODS = {"sendmessage", "sendphoto"}
+FAKE_FILE_ID = "fake-photo-file-id"
+
+
+@dataclass
+class FakeTelegramConfig:
+    latency: float = 0.05
+    jitter: float = 0.02
+    rate: float = 30.0           # сообщений в секунду на бота, 0 — без лимита
+    flood_ratio: float = 0.0     # доля случайных 429 сверх лимита
+    retry_after: int = 1
+    blocked_ratio: float = 0.02  # доля чатов, заблокировавших бота
+    seed: int = 0
+
+
+@dataclass
+class FakeTelegramStats:
+    calls: Counter = field(default_factory=Counter)
+    delivered: int = 0
+    flood: int = 0
+    blocked: int = 0
+    chats: set = field(default_factory=set)
+    first_send: float | None = None
+    last_send: float | None = None
+
+    def summary(self) -> dict:
+        span = (self.last_send - self.first_send) if self.first_send is not None else 0.0
+        return {
+            "calls": dict(self.calls),
+            "delivered": self.delivered,
+            "unique_chats": len(self.chats),
+            "flood_429": self.flood,
+            "blocked_403": self.blocked,
+            "server_span_s": round(span, 3),
+            "server_rate": round(self.delivered / span, 1) if span > 0 else 0.0,
+        }
+
+
+class FakeTelegram:
+    """aiohttp-приложение, отвечающее как Bot API: /bot{token}/{method}."""
+
+    def __init__(self, cfg: FakeTelegramConfig | None = None):
+        self.cfg = cfg or FakeTelegramConfig()
+        self.stats = FakeTelegramStats()
+        self._rnd = random.Random(self.cfg.seed)
+        # окно текущей секунды для глобального лимита
+        self._window = 0
+        self._window_count = 0
+        self._message_id = 0
+
+    def is_blocked(self, chat_id: str) -> bool:
+        # детерминированно по chat_id: повторная рассылка видит тех же «заблокировавших»
+        return zlib.crc32(chat_id.encode()) % 10000 < self.cfg.blocked_ratio * 10000
+
+    def _over_rate(self, now: float) -> bool:
+        if not self.cfg.rate:
+            return False
+        window = int(now)
+        if window != self._window:
+            self._window, self._window_count = window, 0
+        self._window_count += 1
+        return self._window_count > self.cfg.rate
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        self.stats.calls[method] += 1
+        form = await request.post()
+        if self.cfg.latency or self.cfg.jitter:
+            await asyncio.sleep(max(self.cfg.latency + self._rnd.uniform(-self.cfg.jitter, self.cfg.jitter), 0.0))
+
+        if method not in SEND_METHODS:
+            # setWebhook, deleteWebhook, setMyCommands, ... — просто «ок»
+            return _ok(True)
+
+        chat_id = str(form.get("chat_id", "")).strip()
+        now = time.monotonic()
+        if self._over_rate(now) or self._rnd.random() < self.cfg.flood_ratio:
+            self.stats.flood += 1
+            return _error(
+                429,
+                f"Too Many Requests: retry after {self.cfg.retry_after}",
+                parameters={"retry_after": self.cfg.retry_after},
+            )
+        if self.is_blocked(chat_id):
+            self.stats.blocked += 1
+            return _error(403, "Forbidden: bot was blocked by the user")
+
+        self.stats.delivered += 1
+        self.stats.chats.add(chat_id)
+        if self.stats.first_send is None:
+            self.stats.first_send = now
+        self.stats.last_send = now
+        return _ok(self._message(method, chat_id))
+
+    def _message(self, method: str, chat_id: str) -> dict:
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "group" if chat_id.startswith("-") else "private"},
+        }
+        if method == "sendphoto":
+            message["photo"] = [
+                {"file_id": FAKE_FILE_ID, "file_unique_id": "fake-unique", "width": 1280, "height": 720}
+            ]
+        return message
+
+
+def _ok(result) -> web.Response:
+    return web.json_response({"ok": True, "result": result})
+
+
+def _error(code: int, description: str, parameters: dict | None = None) -> web.Response:
+    body = {"ok": False, "error_code": code, "description": description}
+    if parameters:
+        body["parameters"] = parameters
+    return web.json_response(body, status=code)
+
+
+async def start_server(fake: FakeTelegram, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> web.AppRunner:
+    """Поднимает сервер в текущем loop (для нагрузочного прогона в одном процессе)."""
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_arguments(ap: argparse.ArgumentParser) -> None:
+    defaults = FakeTelegramConfig()
+    ap.add_argument("--latency", type=float, default=defaults.latency, help="задержка ответа, секунд")
+    ap.add_argument("--jitter", type=float, default=defaults.jitter, help="разброс задержки, ± секунд")
+    ap.add_argument("--rate", type=float, default=defaults.rate, help="лимит сообщений/с, сверх — 429 (0 — без лимита)")
+    ap.add_argument("--flood-ratio", type=float, default=defaults.flood_ratio, help="доля случайных 429")
+    ap.add_argument("--retry-after", type=int, default=defaults.retry_after, help="retry_after в ответах 429")
+    ap.add_argument("--blocked-ratio", type=float, default=defaults.blocked_ratio, help="доля чатов с 403 blocked")
+    ap.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args) -> FakeTelegramConfig:
+    return FakeTelegramConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate=args.rate,
+        flood_ratio=args.flood_ratio,
+        retry_after=args.retry_after,
+        blocked_ratio=args.blocked_ratio,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    add_arguments(ap)
+    args = ap.parse_args(argv)
+
+    fake = FakeTelegram(config_from_args(args))
+    try:
+        web.run_app(fake.app(), host=args.host, port=args.port, access_log=None)
+    finally:
+        print(fake.stats.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Нагрузочный прогон ежедневной рассылки без настоящего Telegram:
+  - поднимает benchmarks/fake_telegram.py в этом же процессе (или берёт
+    уже запущенный по --server-url) и направляет на него loader.bot;
+  - заполняет users синтетическими чатами в отдельной схеме Postgres
+    (--schema, боевая таблица не трогается);
+  - наполняет временный архив ссылок и запускает daily_digest_job целиком:
+    постраничное чтение подписчиков, рендер, отправка, журнал рассылки.
+
+Результат — JSON: время доставки от старта до последнего сообщения,
+пропускная способность, итоги рассылки и статистика фейкового сервера.
+
+    python -m benchmarks.loadtest --chats 50000 --latency 0.05 --rate 30
+    python -m benchmarks.loadtest --chats 50000 --rate 0 --global-rate 1000
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import fake_telegram
+from config_data import config
+
+
+DEFAULT_SCHEMA = "loadtest"
+FIRST_CHAT_ID = 10 ** 9
+
+
+async def fill_synthetic_users(chat_ids, excluded=lambda chat_id: "") -> None:
+    """
+    Заменяет содержимое users синтетическими чатами (COPY одним потоком).
+    Только в отдельной схеме — боевую таблицу не трогает.
+    """
+    from pg_maker import db_connection
+
+    if config.DB_SCHEMA == "public":
+        raise RuntimeError("Синтетические подписчики пишутся только в отдельную схему (DB_SCHEMA)")
+    async with db_connection() as conn:
+        async with conn.transaction():
+            await conn.execute("TRUNCATE users")
+            await conn.copy_records_to_table(
+                "users",
+                schema_name=config.DB_SCHEMA,
+                records=((chat_id, excluded(chat_id)) for chat_id in chat_ids),
+                columns=("telegram_id", "excluded"),
+            )
+
+
+async def run(args, workdir) -> dict:
+    from benchmarks.bench import _fill_store, _use_store
+    from utils import broadcast, parser
+    from utils.media_cache import media_cache
+    from utils.preferences import dump_excluded
+    import pg_maker
+
+    _use_store(os.path.join(workdir, "loadtest.sqlite3"))
+    _fill_store(args.archive)
+    # file_id картинки с настоящего Telegram фейковому серверу незнаком
+    media_cache.cache_file = os.path.join(workdir, "media_cache.json")
+    media_cache._data = {}
+    if args.global_rate:
+        broadcast.GLOBAL_RATE = args.global_rate
+
+    runner = None
+    fake = None
+    if not args.server_url:
+        fake = fake_telegram.FakeTelegram(fake_telegram.config_from_args(args))
+        runner = await fake_telegram.start_server(fake, port=args.port)
+    try:
+        await pg_maker.migrate()
+        chat_ids = [str(FIRST_CHAT_ID + i) for i in range(args.chats)]
+        every = round(1 / args.excluded_share) if args.excluded_share else 0
+        started = time.perf_counter()
+        await fill_synthetic_users(
+            chat_ids,
+            # каждый every-й подписчик отключил Хабр — второй вариант дайджеста
+            excluded=lambda chat_id: dump_excluded({"habr"}) if every and int(chat_id) % every == 0 else "",
+        )
+        seed_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        stats = await parser.daily_digest_job()
+        elapsed = time.perf_counter() - started
+    finally:
+        await parser.bot.session.close()
+        await pg_maker.close_pool()
+        if runner is not None:
+            await runner.cleanup()
+
+    report = {
+        "chats": args.chats,
+        "seed_users_s": round(seed_time, 3),
+        "delivery_s": round(elapsed, 3),
+        "throughput": round(stats.sent / elapsed, 1) if stats and elapsed > 0 else 0.0,
+        "broadcast": stats.summary() if stats else "рассылки не было",
+    }
+    if fake is not None:
+        report["server"] = fake.stats.summary()
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chats", type=int, default=50000, help="сколько синтетических подписчиков")
+    ap.add_argument("--excluded-share", type=float, default=0.1, help="доля подписчиков с отключённым источником")
+    ap.add_argument("--archive", type=int, default=1000, help="размер синтетического архива ссылок")
+    ap.add_argument("--schema", default=DEFAULT_SCHEMA, help="схема Postgres для синтетической таблицы users")
+    ap.add_argument("--server-url", help="адрес уже запущенного фейкового Bot API (иначе поднимается свой)")
+    ap.add_argument("--port", type=int, default=fake_telegram.DEFAULT_PORT)
+    ap.add_argument("--global-rate", type=float, help="переопределить broadcast.GLOBAL_RATE, сообщений/с")
+    ap.add_argument("--out", help="файл для результата (по умолчанию stdout)")
+    fake_telegram.add_arguments(ap)
+    args = ap.parse_args(argv)
+
+    if args.schema == "public":
+        ap.error("нагрузочный прогон пишет в users — нужна отдельная схема, не public")
+    # до импорта loader: бот создаётся при импорте и сразу берёт адрес API
+    config.TELEGRAM_API_URL = args.server_url or f"http://127.0.0.1:{args.port}"
+    config.DB_SCHEMA = args.schema
+
+    # служебные print() из задачи не должны попадать в результат
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args, workdir))
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        json.dump(report, out, ensure_ascii=False, indent=2)
+        out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Перезаписывает benchmarks/fixtures свежими страницами источников
+(нужна сеть). Запускать, когда поменялась вёрстка на сайтах.
+
+    python -m benchmarks.record_fixtures
+"""
+import asyncio
+import os
+
+from benchmarks.bench import FIXTURES_DIR
+from utils.http_client import close_session, get_session
+
+
+SOURCE_PAGES = {
+    "sostav.html": "https://www.sostav.ru/news/digital",
+    "vc.html": "https://vc.ru/design",
+    "habr.xml": "https://habr.com/ru/rss/flows/design/articles/?fl=ru",
+    "dsgners.html": "https://dsgners.ru/",
+    "dsgners_news.html": "https://dsgners.ru/news",
+}
+
+
+async def record():
+    try:
+        for fixture, url in SOURCE_PAGES.items():
+            async with get_session().get(url) as resp:
+                resp.raise_for_status()
+                body = await resp.read()
+            with open(os.path.join(FIXTURES_DIR, fixture), "wb") as f:
+                f.write(body)
+            print(f"{fixture}: {len(body)} байт с {url}")
+    finally:
+        await close_session()
+
+
+if __name__ == "__main__":
+    asyncio.run(record())
@@ -12,8 +12,21 @@ DB_NAME = os.getenv('DB_NAME')
 DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_HOST = os.getenv('DB_HOST')
+DB_SCHEMA = os.getenv('DB_SCHEMA', 'public')
+# архив ссылок, история, журнал рассылки (SQLite); рядом — блокировка ведущего,
+# поэтому все процессы бота должны видеть один и тот же файл (один хост)
+STORE_PATH = os.getenv('STORE_PATH', 'digest.sqlite3')
+# не повторять материал в дайджесте столько дней
+SENT_RETENTION_DAYS = int(os.getenv('SENT_RETENTION_DAYS', '180'))
+# сколько процессов принимают вебхук (общий порт через SO_REUSEPORT)
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))
+# свой адрес Bot API (например, benchmarks/fake_telegram.py для нагрузочных прогонов)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+
+ADMIN_CHAT_ID = 68086662
 
 
 DEFAULT_COMMANDS = (
     ("start", "Запустить бота"),
+    ("sources", "Выбрать источники и разделы"),
 )
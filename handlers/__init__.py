@@ -1,8 +1,12 @@
 from .start import router_start
+from .preferences import router_preferences
+from .profile import router_profile
 from .echo import router_echo
 
 
 routers = [
     router_start,
+    router_preferences,
+    router_profile,
     router_echo
 ]
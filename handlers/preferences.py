@@ -0,0 +1,97 @@
+import asyncio
+
+from aiogram import F, Router
+from aiogram.enums import ChatMemberStatus
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from pg_maker import get_excluded, set_excluded
+from utils.preferences import PREF_KINDS, PREF_SOURCES, dump_excluded, parse_excluded, toggle
+from utils.registrations import registrations
+
+router_preferences = Router()
+
+CALLBACK_PREFIX = "pref:"
+NOT_SUBSCRIBED = "Сначала подпишитесь на дайджест: /start"
+ADMINS_ONLY = "Настройки дайджеста группы меняют только её администраторы"
+GROUP_ADMIN_STATUSES = (ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR)
+
+
+def _subscriber_id(chat, user) -> str:
+    """Тот же id, под которым чат записан в /start."""
+    if chat.type == "private":
+        return str(user.id)
+    return str(chat.id)
+
+
+async def _load_excluded(telegram_id: str) -> str | None:
+    """Настройки подписчика; None — его нет в users."""
+    raw = await get_excluded(telegram_id)
+    if raw is None:
+        # /start мог быть только что и ещё лежать в буфере регистраций: свой
+        # буфер сбрасываем сразу, буфер другого воркера уйдёт в БД по таймеру
+        await registrations.flush()
+        raw = await get_excluded(telegram_id)
+    if raw is None:
+        await asyncio.sleep(registrations.flush_interval)
+        raw = await get_excluded(telegram_id)
+    return raw
+
+
+async def _can_change(callback: CallbackQuery) -> bool:
+    """В группе настройки общие для всех — менять их может только администратор."""
+    chat = callback.message.chat
+    if chat.type == "private":
+        return True
+    member = await callback.bot.get_chat_member(chat.id, callback.from_user.id)
+    return member.status in GROUP_ADMIN_STATUSES
+
+
+def preferences_markup(excluded) -> InlineKeyboardMarkup:
+    buttons = [
+        InlineKeyboardButton(
+            text=f"{'❌' if key in excluded else '✅'} {title}",
+            callback_data=f"{CALLBACK_PREFIX}{key}",
+        )
+        for key, title in (*PREF_SOURCES.items(), *PREF_KINDS.items())
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons[i:i + 2] for i in range(0, len(buttons), 2)])
+
+
+@router_preferences.message(Command("sources"))
+async def sources_handler(message: Message):
+    telegram_id = _subscriber_id(message.chat, message.from_user)
+    raw = await _load_excluded(telegram_id)
+    if raw is None:
+        await message.answer(NOT_SUBSCRIBED)
+        return
+    excluded = parse_excluded(raw)
+    await message.answer(
+        "Что присылать в дайджесте? Нажмите, чтобы включить или выключить:",
+        reply_markup=preferences_markup(excluded),
+    )
+
+
+@router_preferences.callback_query(F.data.startswith(CALLBACK_PREFIX))
+async def toggle_preference_handler(callback: CallbackQuery):
+    key = callback.data[len(CALLBACK_PREFIX):]
+    telegram_id = _subscriber_id(callback.message.chat, callback.from_user)
+    if not await _can_change(callback):
+        await callback.answer(ADMINS_ONLY, show_alert=True)
+        return
+
+    raw = await _load_excluded(telegram_id)
+    if raw is None:
+        await callback.answer(NOT_SUBSCRIBED, show_alert=True)
+        return
+    excluded = parse_excluded(raw)
+    updated = toggle(excluded, key)
+    if updated == excluded:
+        await callback.answer("Хотя бы один источник и один раздел должны остаться")
+        return
+
+    if not await set_excluded(telegram_id, dump_excluded(updated)):
+        await callback.answer(NOT_SUBSCRIBED, show_alert=True)
+        return
+    await callback.message.edit_reply_markup(reply_markup=preferences_markup(updated))
+    await callback.answer()
@@ -0,0 +1,41 @@
+import html
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+
+from config_data import config
+from utils import leader
+from utils.profiling import profile_digest
+
+router_profile = Router()
+# команда только для админа: остальным она просто не отвечает
+router_profile.message.filter(F.from_user.id == config.ADMIN_CHAT_ID)
+
+MAX_REPORT_LENGTH = 4000
+
+
+@router_profile.message(Command("profile"))
+async def profile_handler(message: Message, command: CommandObject):
+    """
+    /profile — холостой прогон дайджеста под профилировщиком;
+    /profile send — с настоящей отправкой; /profile harvest — с опросом
+    источников перед прогоном. send и harvest пишут в хранилище — только у ведущего.
+    """
+    args = set((command.args or "").split())
+    dry_run = "send" not in args
+    harvest = "harvest" in args
+    if (not dry_run or harvest) and not leader.is_leader:
+        await message.answer("Отправка и опрос источников — только у ведущего процесса, а этот — нет. Холостой прогон: /profile")
+        return
+
+    await message.answer("Профилирую рассылку…" if not dry_run else "Профилирую холостой прогон дайджеста…")
+    try:
+        report = await profile_digest(dry_run=dry_run, harvest=harvest)
+    except Exception as e:
+        await message.answer(f"Профилирование упало: {html.escape(f'{type(e).__name__}: {e}')}")
+        return
+
+    await message.answer(f"<pre>{html.escape(report.render())[:MAX_REPORT_LENGTH]}</pre>")
+    await message.answer_document(FSInputFile(report.text_path))
+    await message.answer_document(FSInputFile(report.prof_path), caption="snakeviz / flameprof")
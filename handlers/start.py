@@ -1,7 +1,7 @@
 from aiogram import Router
 from aiogram.filters import CommandStart
 
-from pg_maker import add_user
+from utils.registrations import registrations
 
 router_start = Router()
 
@@ -13,5 +13,5 @@ async def command_start_handler(message):
     else:
         telegram_id = str(message.chat.id)
 
-    await add_user(telegram_id=telegram_id)
+    registrations.register(telegram_id)
     await message.answer(f"Дайджест выходит в понедельник-пятницу в 11 часов по Москве")
@@ -1 +1 @@
-from . import calendar
\ No newline at end of file
+from . import create_markup
\ No newline at end of file
@@ -1,18 +1,17 @@
-from telebot import types
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
 
 def create_markup(buttons):
     """ Создает кнопки для ответа """
 
-    markup = types.InlineKeyboardMarkup()
-    for text, callback_data in buttons:
-        markup.add(types.InlineKeyboardButton(text=text, callback_data=callback_data))
-    return markup
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=callback_data)]
+        for text, callback_data in buttons
+    ])
 
 def create_markup_with_url(buttons):
-    markup = types.InlineKeyboardMarkup()
-    for text, url, callback_data in buttons:
-        button = types.InlineKeyboardButton(text=text, url=url, callback_data=callback_data)
-        markup.add(button)
-    # for text, url in buttons:
-    #     markup.add(types.InlineKeyboardButton(text=text, url=url))
-    return markup
+    # у кнопки в Telegram должно быть что-то одно: url или callback_data
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, url=url) if url else InlineKeyboardButton(text=text, callback_data=callback_data)]
+        for text, url, callback_data in buttons
+    ])
@@ -1,23 +1,59 @@
+from utils import cold_start  # первым: отсчёт холодного старта
+
 import asyncio
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+
+from config_data import config
+
+# Несколько воркеров за одним портом: /metrics попадает в случайный из них,
+# поэтому метрики собираются из общего каталога (multiprocess mode
+# prometheus_client). Переменная нужна до первого импорта prometheus_client.
+PROMETHEUS_DIR = "/tmp/digest_prometheus"
+
+
+def prepare_multiprocess_metrics() -> None:
+    """Каталог должен существовать и быть пустым: файлы прошлых процессов иначе попадут в сумму."""
+    path = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", PROMETHEUS_DIR)
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+
+
+if __name__ == "__main__" and config.LOCAL_ENV != "local" and config.WEB_WORKERS > 1:
+    prepare_multiprocess_metrics()
 
 from aiogram.types import BotCommand, BotCommandScopeDefault
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
 
-from config_data import config
 from handlers import routers
 from loader import bot, dp
-from utils.scheduler import tasks_checker
-# from middlewares.logging_middleware import LoggingMiddleware
+from pg_maker import close_pool, create_pool, migrate
+from middlewares.logging_middleware import LoggingMiddleware
+from middlewares.metrics_middleware import UpdateTimingMiddleware
+from utils import leader
+from utils.metrics import mark_worker_dead, metrics_handler
+from utils.registrations import registrations
+from utils.scheduler import cancel_running_jobs, tasks_checker
+
+cold_start.mark("imports")
 
 
 LOCAL_ENV = config.LOCAL_ENV
 WEBHOOK_URL = "https://glinkin.pro"
 ROUTE_FOR_WEBHOOK = "/webhook_digest"
+ROUTE_FOR_METRICS = "/metrics"
 PORT = 5011
 HOST = "0.0.0.0"
 BOT_TOKEN = config.BOT_TOKEN
 
+_scheduler = None
+
 
 async def set_commands():
     commands = [
@@ -30,24 +66,62 @@ async def set_commands():
 def routers_and_middleware():
     for router in routers:
         dp.include_router(router)
-    # dp.message.middleware(LoggingMiddleware())
-    # dp.callback_query.middleware(LoggingMiddleware())
+    dp.update.outer_middleware(UpdateTimingMiddleware())
+    dp.message.middleware(LoggingMiddleware())
+    dp.callback_query.middleware(LoggingMiddleware())
+
+
+async def on_elected() -> None:
+    """Процесс стал ведущим: только он собирает ссылки и шлёт дайджест."""
+    global _scheduler
+    _scheduler = tasks_checker()
+
+
+async def on_lost() -> None:
+    """Лидерство потеряно: новых запусков нет, а идущие (рассылка, сбор) — отменяем."""
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+    await cancel_running_jobs()
 
 
 async def on_startup() -> None:
-    await set_commands()
-    await bot.set_webhook(f"{WEBHOOK_URL}{ROUTE_FOR_WEBHOOK}")
-    await bot.send_message(chat_id=68086662, text="Бот запущен на вебхуках!")
-    tasks_checker()
+    await create_pool()
+    await migrate()
+    registrations.start()
+    await leader.start(on_elected, on_lost)
+    if leader.is_leader:
+        # независимые запросы к Telegram — параллельно
+        await asyncio.gather(
+            set_commands(),
+            bot.set_webhook(f"{WEBHOOK_URL}{ROUTE_FOR_WEBHOOK}"),
+        )
+        cold_start.mark("webhook")
+        await bot.send_message(
+            chat_id=config.ADMIN_CHAT_ID,
+            text=f"Бот запущен на вебхуках! Воркеров: {config.WEB_WORKERS}\n{cold_start.report()}",
+        )
 
 
 async def on_shutdown() -> None:
-    await bot.send_message(chat_id=68086662, text="Бот остановлен!")
-    await bot.delete_webhook(drop_pending_updates=True)
+    from utils.http_client import close_session
+
+    was_leader = leader.is_leader
+    await leader.stop()
+    await on_lost()
+    await registrations.stop()
+    if was_leader:
+        await bot.send_message(chat_id=config.ADMIN_CHAT_ID, text="Бот остановлен!")
+        # остальные воркеры ещё принимают апдейты — вебхук снимаем, только если процесс один
+        if config.WEB_WORKERS == 1:
+            await bot.delete_webhook(drop_pending_updates=True)
+    await close_session()
+    await close_pool()
     await bot.session.close()
 
 
-def main_webhook() -> None:
+def main_webhook(reuse_port: bool = False) -> None:
     routers_and_middleware()
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
@@ -55,24 +129,77 @@ def main_webhook() -> None:
     app = web.Application()
     webhook_requests_handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
     webhook_requests_handler.register(app, path=ROUTE_FOR_WEBHOOK)
+    app.router.add_get(ROUTE_FOR_METRICS, metrics_handler)
     setup_application(app, dp, bot=bot)
 
     loop = asyncio.new_event_loop()
-    web.run_app(app, host=HOST, port=PORT, loop=loop)
+    web.run_app(app, host=HOST, port=PORT, loop=loop, reuse_port=reuse_port)
+
+
+def run_worker(index: int) -> None:
+    from utils.logger import stop_listener, use_worker_log
+
+    use_worker_log(index)
+    try:
+        main_webhook(reuse_port=True)
+    finally:
+        stop_listener()  # после fork atexit в дочернем процессе не вызывается
+
+
+def main_workers(workers: int) -> None:
+    """
+    workers процессов слушают один порт (SO_REUSEPORT), ядро раскидывает
+    между ними входящие вебхуки. Процессы форкаются уже с импортированным
+    кодом — второй раз aiogram не грузится. Упал один — гасим всех и
+    выходим: перезапуск за watchmedo/docker.
+    """
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=run_worker, args=(i,), name=f"webhook-{i}") for i in range(workers)]
+    for process in processes:
+        process.start()
+    interrupted = False
+    try:
+        multiprocessing.connection.wait([p.sentinel for p in processes])
+    except KeyboardInterrupt:
+        # SIGINT пришёл всей группе (Ctrl+C, watchmedo) — воркеры уже гасятся сами;
+        # второй сигнал оборвал бы их on_shutdown вместе с записью регистраций
+        interrupted = True
+    finally:
+        for process in processes:
+            if process.is_alive() and not interrupted:
+                process.terminate()
+        for process in processes:
+            process.join()
+            mark_worker_dead(process.pid)
 
 
 async def main():
-    await set_commands()
+    from utils.http_client import close_session
+
+    await create_pool()
+    await asyncio.gather(migrate(), set_commands())
     routers_and_middleware()
+    registrations.start()
 
     await bot.delete_webhook(drop_pending_updates=True)
-    await bot.send_message(chat_id=68086662, text="Бот запущен локально!")
-    tasks_checker()
-    await dp.start_polling(bot)
+    cold_start.mark("polling")
+    await bot.send_message(chat_id=config.ADMIN_CHAT_ID, text=f"Бот запущен локально!\n{cold_start.report()}")
+    await leader.start(on_elected, on_lost)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await leader.stop()
+        await on_lost()
+        await registrations.stop()
+        await close_session()
+        await close_pool()
 
 
 if __name__ == "__main__":
     if LOCAL_ENV == "local":
         asyncio.run(main())
+    elif config.WEB_WORKERS > 1:
+        main_workers(config.WEB_WORKERS)
     else:
         main_webhook()
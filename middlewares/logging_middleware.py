@@ -1,26 +1,32 @@
-# from aiogram.dispatcher.middlewares.base import BaseMiddleware
-# from aiogram.types import CallbackQuery, Message
-#
-# from utils.logger import logger
-#
-#
-# class LoggingMiddleware(BaseMiddleware):
-#     async def __call__(self, handler, event, data):
-#         try:
-#             if isinstance(event, Message):
-#                 username = (
-#                     f"@{event.from_user.username}"
-#                     if event.from_user.username
-#                     else f"ID: {event.from_user.id}"
-#                 )
-#                 logger.warning(f"{username}: команда {event.text}")
-#             elif isinstance(event, CallbackQuery):
-#                 username = (
-#                     f"@{event.from_user.username}"
-#                     if event.from_user.username
-#                     else f"ID: {event.from_user.id}"
-#                 )
-#                 logger.warning(f"{username}: callback {event.data}")
-#         except Exception as e:
-#             logger.error(f"Error in LoggingMiddleware: {e}")
-#         return await handler(event, data)
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+
+from utils.logger import logger
+
+
+class LoggingMiddleware(BaseMiddleware):
+    """
+    Аудит команд и callback'ов. Здесь только собираем поля записи —
+    форматирование и запись в файл идут в фоновом потоке (см. utils/logger.py).
+    """
+
+    async def __call__(self, handler, event, data):
+        try:
+            if isinstance(event, Message):
+                logger.info("message", extra={"fields": {
+                    "kind": "message",
+                    "user_id": event.from_user.id if event.from_user else None,
+                    "username": event.from_user.username if event.from_user else None,
+                    "chat_id": event.chat.id,
+                    "text": event.text,
+                }})
+            elif isinstance(event, CallbackQuery):
+                logger.info("callback", extra={"fields": {
+                    "kind": "callback",
+                    "user_id": event.from_user.id,
+                    "username": event.from_user.username,
+                    "data": event.data,
+                }})
+        except Exception as e:
+            logger.error(f"Error in LoggingMiddleware: {e}")
+        return await handler(event, data)
@@ -0,0 +1,18 @@
+import time
+
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+
+from utils import cold_start
+from utils.metrics import UPDATE_SECONDS
+
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    """Меряет, сколько обрабатывается каждый входящий апдейт (по типу события)."""
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_SECONDS.labels(event.event_type).observe(time.perf_counter() - started)
+            cold_start.first_update()
@@ -2,46 +2,182 @@ from contextlib import asynccontextmanager
 from config_data import config
 import asyncpg
 
+from utils.metrics import DB_POOL_IDLE, DB_POOL_SIZE
+
 dbname = config.DB_NAME
 user = config.DB_USER
 password = config.DB_PASSWORD
 host = config.DB_HOST
 
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 10
+SUBSCRIBERS_PAGE_SIZE = 1000
+
+# Ключ advisory-блокировки миграций (произвольное, но постоянное число)
+MIGRATION_LOCK_KEY = 0x64696701
+
+# Миграции применяются один раз при старте (каждая — идемпотентна)
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        telegram_id VARCHAR PRIMARY KEY
+    );
+    """,
+    """
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS excluded VARCHAR NOT NULL DEFAULT '';
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS users_chat_id ON users (btrim(telegram_id));
+    """,
+    """
+    ALTER TABLE users
+        ADD COLUMN IF NOT EXISTS active BOOLEAN NOT NULL DEFAULT TRUE,
+        ADD COLUMN IF NOT EXISTS failures INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS last_error VARCHAR;
+    """,
+]
+
+_pool: asyncpg.Pool | None = None
+
+
+
+def _update_pool_gauges() -> None:
+    # не set_function: в multiprocess-режиме Prometheus вызываемые значения не собирает
+    DB_POOL_SIZE.set(_pool.get_size() if _pool is not None else 0)
+    DB_POOL_IDLE.set(_pool.get_idle_size() if _pool is not None else 0)
+
+
+async def create_pool() -> asyncpg.Pool:
+    """Создаёт общий пул соединений приложения (вызывается при старте)."""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            database=dbname, user=user, password=password, host=host,
+            min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+            server_settings={"search_path": config.DB_SCHEMA},
+        )
+        _update_pool_gauges()
+    return _pool
+
+
+async def close_pool() -> None:
+    """Закрывает пул (вызывается при остановке)."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        _update_pool_gauges()
+
+
+async def migrate() -> None:
+    """
+    Создаёт/обновляет схему БД. Выполняется один раз при старте, а не на каждый запрос.
+    Несколько воркеров стартуют одновременно — миграции идут по очереди под блокировкой.
+    """
+    async with db_connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK_KEY)
+            if config.DB_SCHEMA != "public":
+                await conn.execute(f"CREATE SCHEMA IF NOT EXISTS {_quote_ident(config.DB_SCHEMA)}")
+            for sql in MIGRATIONS:
+                await conn.execute(sql)
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
 
 @asynccontextmanager
 async def db_connection():
-    """Контекстный менеджер для асинхронного подключения к базе данных."""
-    conn = await asyncpg.connect(
-        database=dbname, user=user, password=password, host=host
-    )
+    """Контекстный менеджер: берёт соединение из общего пула и возвращает его обратно."""
+    pool = await create_pool()
     try:
-        yield conn
+        async with pool.acquire() as conn:
+            _update_pool_gauges()
+            yield conn
     finally:
-        await conn.close()
+        _update_pool_gauges()
 
 
-async def add_user(telegram_id):
+async def add_users(telegram_ids) -> None:
+    """
+    Пакетная регистрация: один executemany на всю пачку. Уже активные id
+    не трогаются, отключённые (бот был заблокирован) — включаются обратно.
+    """
     async with db_connection() as conn:
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                telegram_id VARCHAR PRIMARY KEY
-            );
-        """)
-
-        sql = """
+        await conn.executemany("""
             INSERT INTO users (telegram_id)
             VALUES ($1)
-            ON CONFLICT (telegram_id) DO NOTHING;
-        """
-        await conn.execute(sql, telegram_id)
+            ON CONFLICT (telegram_id) DO UPDATE SET active = TRUE, failures = 0, last_error = NULL
+            WHERE NOT users.active;
+        """, [(telegram_id,) for telegram_id in telegram_ids])
+
+
+async def record_failures(failures) -> None:
+    """
+    Итоги рассылки по неудачным чатам: (chat_id, ошибка, чат мёртв).
+    Счётчик и последняя ошибка пишутся всем, мёртвые чаты ещё и отключаются.
+    """
+    async with db_connection() as conn:
+        await conn.executemany("""
+            UPDATE users
+            SET failures = failures + 1, last_error = $2, active = active AND NOT $3
+            WHERE btrim(telegram_id) = $1;
+        """, [(str(chat_id), error[:500], dead) for chat_id, error, dead in failures])
+
+
+async def iter_subscribers(page_size: int = SUBSCRIBERS_PAGE_SIZE):
+    """
+    Активные подписчики (chat_id, excluded) постранично: keyset по btrim(telegram_id)
+    (индекс users_chat_id), между страницами соединение возвращается в пул.
+    Дубли и пустые id отсекает сам запрос — в памяти только одна страница.
+    """
+    last = ""
+    while True:
+        async with db_connection() as conn:
+            stmt = await conn.prepare("""
+                SELECT DISTINCT ON (btrim(telegram_id)) btrim(telegram_id) AS chat_id, excluded
+                FROM users
+                WHERE active AND btrim(telegram_id) > $1
+                ORDER BY btrim(telegram_id)
+                LIMIT $2
+            """)
+            rows = await stmt.fetch(last, page_size)
+        for row in rows:
+            yield row["chat_id"], row["excluded"]
+        if len(rows) < page_size:
+            return
+        last = rows[-1]["chat_id"]
 
 
-async def all_users():
+async def active_exclusions() -> list[str]:
+    """Различные наборы отключённого у активных подписчиков — по ним рендерятся варианты дайджеста."""
     async with db_connection() as conn:
-        sql = """
-            SELECT telegram_id
+        return [row["excluded"] for row in await conn.fetch("SELECT DISTINCT excluded FROM users WHERE active")]
+
+
+async def get_excluded(telegram_id) -> str | None:
+    """Что подписчик отключил в дайджесте (строка вида 'habr,news'); None — его нет в users."""
+    async with db_connection() as conn:
+        stmt = await conn.prepare("""
+            SELECT excluded
             FROM users
-        """
-        rows = await conn.fetch(sql, )
-        if rows:
-            return rows
+            WHERE telegram_id = $1
+        """)
+        row = await stmt.fetchrow(telegram_id)
+        return row["excluded"] if row is not None else None
+
+
+async def set_excluded(telegram_id, excluded: str) -> bool:
+    """
+    Меняет настройки только уже подписанному чату; False — его нет в users.
+    Подписка и её восстановление — только через /start (add_users).
+    """
+    async with db_connection() as conn:
+        stmt = await conn.prepare("""
+            UPDATE users
+            SET excluded = $2
+            WHERE telegram_id = $1
+            RETURNING TRUE;
+        """)
+        return bool(await stmt.fetchval(telegram_id, excluded))
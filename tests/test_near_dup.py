@@ -0,0 +1,33 @@
+from utils import near_dup
+
+
+def _near(a: str, b: str) -> bool:
+    tokens_a, tokens_b = near_dup.index_shingles(a), near_dup.index_shingles(b)
+    return tokens_a is not None and tokens_b is not None and near_dup.is_near(tokens_a, tokens_b)
+
+
+def test_templated_titles_of_different_stories_are_not_near():
+    assert not _near("Как мы делали дизайн-систему для Авито", "Как мы делали дизайн-систему для Ozon")
+    assert not _near("Яндекс обновил логотип и фирменный стиль", "Сбер обновил логотип и фирменный стиль")
+
+
+def test_same_story_reworded_is_near():
+    assert _near(
+        "Apple представила новый iPhone 17 с титановым корпусом",
+        "Apple представила новый iPhone 17 в титановом корпусе",
+    )
+
+
+def test_numbers_distinguish_issues():
+    assert not _near("Дайджест дизайна за неделю, выпуск 42", "Дайджест дизайна за неделю, выпуск 43")
+
+
+def test_stop_words_and_short_titles_are_not_indexed():
+    assert near_dup.shingles("Как и для Авито") == {"авито"}
+    assert near_dup.index_shingles("Дайджест №42") is None
+    assert near_dup.index_shingles(near_dup.NO_TITLE) is None
+
+
+def test_shingles_roundtrip():
+    tokens = near_dup.shingles("Apple представила новый iPhone 17")
+    assert near_dup.load_shingles(near_dup.dump_shingles(tokens)) == tokens
@@ -0,0 +1,212 @@
+import asyncio
+import time
+from collections.abc import AsyncIterable, Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from utils.metrics import BROADCAST_RATE, BROADCAST_SECONDS, SEND_ERRORS, SEND_TOTAL
+
+
+# Лимиты Telegram: ~30 сообщений/с на бота, 1/с в личный чат, 20/мин в группу.
+# Берём с запасом, чтобы не ловить flood control.
+GLOBAL_RATE = 25
+PRIVATE_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+CONCURRENCY = 20
+MAX_RETRIES = 3
+# flood control: сколько раз подряд ждать RetryAfter на одном сообщении и
+# сколько секунд ожидания в сумме, прежде чем сдаться по этому чату
+MAX_FLOOD_RETRIES = 5
+MAX_FLOOD_WAIT = 300
+RETRY_BACKOFF = 1.0
+
+TRANSIENT_ERRORS = (TelegramNetworkError, TelegramServerError)
+# 400 с таким текстом — чата больше нет (группу удалили, id неверный)
+DEAD_CHAT_MESSAGES = ("chat not found", "user not found", "group chat was deactivated")
+
+
+def is_dead_chat(error: Exception) -> bool:
+    """Бот заблокирован, выгнан из группы или чата больше нет — слать туда бессмысленно."""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and any(m in str(error).lower() for m in DEAD_CHAT_MESSAGES)
+
+
+class RateLimiter:
+    """
+    Глобальный лимит (равномерные слоты rate в секунду) + минимальный
+    интервал между сообщениями в один и тот же чат.
+    """
+
+    def __init__(self, rate: float | None = None):
+        self.interval = 1.0 / (rate or GLOBAL_RATE)
+        self._next_slot = 0.0
+        self._chat_next: dict[str, float] = {}
+
+    async def acquire(self, chat_id) -> None:
+        key = str(chat_id)
+        chat_wait = self._chat_next.get(key, 0.0) - time.monotonic()
+        if chat_wait > 0:
+            await asyncio.sleep(chat_wait)
+
+        # без await между чтением и записью — гонок внутри одного loop нет
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        per_chat = GROUP_CHAT_INTERVAL if key.startswith("-") else PRIVATE_CHAT_INTERVAL
+        self._chat_next[key] = slot + per_chat
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        """RetryAfter от Telegram — притормаживаем всю рассылку, а не только один чат."""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+@dataclass
+class BroadcastStats:
+    """Итог рассылки: сколько ушло, сколько упало, скорость."""
+
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+    # False — холостой прогон: в Prometheus ничего не пишем
+    metrics: bool = True
+    # все неудачные чаты (не выборка): (chat_id, текст ошибки, чат мёртв)
+    failures: list[tuple[object, str, bool]] = field(default_factory=list)
+
+    @property
+    def dead(self) -> int:
+        return sum(1 for _, _, dead in self.failures if dead)
+
+    @property
+    def duration(self) -> float:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.sent / self.duration if self.duration > 0 else 0.0
+
+    def add_error(self, chat_id, error: Exception) -> None:
+        self.failed += 1
+        if self.metrics:
+            SEND_TOTAL.labels("failed").inc()
+            SEND_ERRORS.labels(type(error).__name__).inc()
+        self.failures.append((chat_id, f"{type(error).__name__}: {error}", is_dead_chat(error)))
+
+    def summary(self) -> str:
+        return (
+            f"Рассылка: {self.sent}/{self.total} доставлено, ошибок {self.failed} "
+            f"(из них отключено мёртвых чатов {self.dead}), "
+            f"повторов {self.retries}, {self.duration:.1f} c, {self.rate:.1f} сообщ./с"
+        )
+
+
+async def aiterate(items):
+    """Одинаково перебирает и обычные, и асинхронные итерируемые (например, постраничный курсор)."""
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _deliver(item, send, chat_id, limiter: RateLimiter, stats: BroadcastStats) -> Exception | None:
+    """Доставляет один item с повторами; возвращает итоговую ошибку или None."""
+    attempt = 0
+    flood_retries, flood_wait = 0, 0.0
+    while True:
+        await limiter.acquire(chat_id)
+        try:
+            await send(item)
+        except TelegramRetryAfter as e:
+            # без предела застрявший во flood control чат держал бы воркер вечно
+            flood_retries += 1
+            flood_wait += e.retry_after
+            if flood_retries > MAX_FLOOD_RETRIES or flood_wait > MAX_FLOOD_WAIT:
+                stats.add_error(chat_id, e)
+                return e
+            stats.retries += 1
+            if stats.metrics:
+                SEND_ERRORS.labels(type(e).__name__).inc()
+            limiter.pause(e.retry_after)
+            continue
+        except TRANSIENT_ERRORS as e:
+            attempt += 1
+            if attempt > MAX_RETRIES:
+                stats.add_error(chat_id, e)
+                return e
+            stats.retries += 1
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            continue
+        except Exception as e:
+            stats.add_error(chat_id, e)
+            return e
+        stats.sent += 1
+        if stats.metrics:
+            SEND_TOTAL.labels("sent").inc()
+        return None
+
+
+async def broadcast(
+    items: Iterable | AsyncIterable,
+    send: Callable[[object], Awaitable],
+    *,
+    chat_id_of: Callable[[object], object] = lambda item: item,
+    concurrency: int = CONCURRENCY,
+    rate: float | None = None,
+    on_done: Callable[[object, Exception | None], None] | None = None,
+    metrics: bool = True,
+) -> BroadcastStats:
+    """
+    Рассылает send(item) по всем items с ограниченной параллельностью.
+    items может быть обычным или асинхронным итератором — отправка
+    начинается сразу, не дожидаясь, пока будут прочитаны все получатели.
+    RetryAfter соблюдается, сетевые ошибки повторяются с backoff.
+    on_done(item, error) вызывается по каждому item с итогом (error=None — доставлено).
+    metrics=False — не писать счётчики и скорость в Prometheus (холостой прогон).
+    """
+    limiter = RateLimiter(rate)
+    stats = BroadcastStats(metrics=metrics)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            try:
+                error = await _deliver(item, send, chat_id_of(item), limiter, stats)
+                if on_done is not None:
+                    try:
+                        on_done(item, error)
+                    except Exception as e:  # сбой учёта не должен останавливать рассылку
+                        print(f"broadcast: on_done: {type(e).__name__}: {e}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for item in aiterate(items):
+            stats.total += 1
+            await queue.put(item)
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        stats.finished = time.monotonic()
+        if metrics:
+            BROADCAST_SECONDS.observe(stats.duration)
+            BROADCAST_RATE.set(stats.rate)
+    return stats
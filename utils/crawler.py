@@ -0,0 +1,222 @@
+"""
+Обход листингов источников вглубь по страницам — для бэкфилла архива
+(пустая свежая установка) и чтобы не терять то, что успело уехать с первой
+страницы между опросами.
+
+Страницы одного источника идут по порядку: следующая запрашивается, только
+если на текущей ещё есть новое. Обход останавливается на уже виденных
+ссылках, на горизонте по дате, на пустой странице или на глубине max_pages.
+Разные источники обходятся параллельно (ограниченная очередь + воркеры),
+к одному хосту — не больше HOST_CONCURRENCY запросов и не чаще HOST_DELAY.
+
+    python -m utils.crawler --max-pages 20 --days 30
+    python -m utils.crawler --sources habr,vc --max-pages 5
+"""
+import argparse
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from utils import link_store
+from utils.http_client import fetch_text
+
+
+CRAWL_MAX_PAGES = 10
+CRAWL_CONCURRENCY = 4
+HOST_CONCURRENCY = 1
+HOST_DELAY = 1.0        # секунд между запросами к одному хосту
+PAGE_TIMEOUT = 20
+# на странице столько уже известных ссылок — дальше только старое.
+# Не 1.0: репост старого материала или почти-дубликат не должен сбивать обход
+STOP_SEEN_SHARE = 0.5
+
+
+@dataclass(frozen=True)
+class CrawlTarget:
+    """Листинг источника: адрес n-й страницы (None — страниц больше нет) и разбор."""
+
+    name: str
+    kind: str
+    page_url: Callable[[int], str | None]
+    parse: Callable[[str], Awaitable[list]]
+
+
+@dataclass
+class CrawlResult:
+    """Итог обхода одного источника."""
+
+    name: str
+    pages: int = 0
+    found: int = 0
+    new: int = 0
+    stopped: str = ""
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class HostPoliteness:
+    """Не больше concurrency одновременных запросов к хосту и пауза delay между ними."""
+
+    def __init__(self, concurrency: int = HOST_CONCURRENCY, delay: float = HOST_DELAY):
+        self.concurrency = concurrency
+        self.delay = delay
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self._next: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = urlsplit(url).hostname or ""
+        semaphore = self._slots.setdefault(host, asyncio.Semaphore(self.concurrency))
+        async with semaphore:
+            wait = self._next.get(host, 0.0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                yield
+            finally:
+                self._next[host] = time.monotonic() + self.delay
+
+
+async def _crawl_page(target: CrawlTarget, page: int, result: CrawlResult, *,
+                      max_pages: int, horizon: float | None, politeness: HostPoliteness) -> bool:
+    """Обрабатывает одну страницу; True — стоит идти на следующую."""
+    url = target.page_url(page) if page <= max_pages else None
+    if url is None:
+        result.stopped = "глубина"
+        return False
+
+    try:
+        async with politeness.slot(url):
+            body = await asyncio.wait_for(fetch_text(url), PAGE_TIMEOUT)
+        items = await target.parse(body)
+        # дата есть не у всех источников (только у RSS) — недатированное не отсекаем
+        fresh = [item for item in items if horizon is None or len(item) < 3 or item[2] is None or item[2] >= horizon]
+        # первая страница — то же, что видит обычный опрос; дальше — старое
+        new = link_store.add_links(fresh, target.kind, backfill=page > 1) if fresh else []
+    except aiohttp.ClientResponseError as e:
+        if e.status == 404 and page > 1:
+            result.stopped = "конец ленты"
+        else:
+            result.stopped, result.error = "ошибка", e
+        return False
+    except Exception as e:
+        result.stopped, result.error = "ошибка", e
+        return False
+
+    result.pages += 1
+    if not items:
+        result.stopped = "пустая страница"
+        return False
+
+    result.found += len(items)
+    result.new += len(new)
+
+    if len(fresh) < len(items):
+        result.stopped = "горизонт по дате"
+        return False
+    if len(fresh) - len(new) >= len(fresh) * STOP_SEEN_SHARE:
+        result.stopped = "дальше уже виденное"
+        return False
+    return True
+
+
+async def crawl(
+    targets: list[CrawlTarget],
+    *,
+    max_pages: int = CRAWL_MAX_PAGES,
+    horizon_days: float | None = None,
+    concurrency: int = CRAWL_CONCURRENCY,
+    politeness: HostPoliteness | None = None,
+) -> list[CrawlResult]:
+    """
+    Обходит листинги targets вглубь; новые ссылки сразу пишутся в архив
+    (link_store.add_links — с проверкой на дубликаты и почти-дубликаты).
+    """
+    if not targets:
+        return []
+    politeness = politeness or HostPoliteness()
+    horizon = time.time() - horizon_days * 24 * 60 * 60 if horizon_days else None
+    results = {target.name: CrawlResult(target.name) for target in targets}
+    # у каждого источника в очереди не больше одной страницы: воркер кладёт
+    # следующую, только забрав текущую, — очередь на len(targets) не переполнится
+    queue: asyncio.Queue = asyncio.Queue(maxsize=len(targets))
+    for target in targets:
+        queue.put_nowait((target, 1))
+
+    async def worker():
+        while True:
+            target, page = await queue.get()
+            try:
+                more = await _crawl_page(
+                    target, page, results[target.name],
+                    max_pages=max_pages, horizon=horizon, politeness=politeness,
+                )
+                if more:
+                    queue.put_nowait((target, page + 1))
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(targets)))]
+    try:
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return list(results.values())
+
+
+def format_crawl_report(results: list[CrawlResult]) -> str:
+    lines = []
+    for r in results:
+        status = f"ошибка {type(r.error).__name__}: {r.error}" if r.error else r.stopped
+        lines.append(f"{r.name}: страниц {r.pages}, ссылок {r.found}, новых {r.new} ({status})")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sources", help="источники через запятую (по умолчанию все)")
+    ap.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES, help="глубина обхода, страниц на источник")
+    ap.add_argument("--days", type=float, help="горизонт по дате публикации, дней (где дата известна)")
+    ap.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    ap.add_argument("--delay", type=float, default=HOST_DELAY, help="пауза между запросами к одному хосту, секунд")
+    args = ap.parse_args(argv)
+
+    from utils.http_client import close_session
+    from utils.parser import CRAWL_TARGETS
+
+    names = args.sources.split(",") if args.sources else list(CRAWL_TARGETS)
+    unknown = [name for name in names if name not in CRAWL_TARGETS]
+    if unknown:
+        ap.error(f"неизвестные источники: {', '.join(unknown)}")
+
+    async def run():
+        try:
+            return await crawl(
+                [CRAWL_TARGETS[name] for name in names],
+                max_pages=args.max_pages,
+                horizon_days=args.days,
+                concurrency=args.concurrency,
+                politeness=HostPoliteness(delay=args.delay),
+            )
+        finally:
+            await close_session()
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    link_store.close()
+    print(format_crawl_report(results))
+    print(f"за {time.perf_counter() - started:.1f} c")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import hashlib
+import html
+import json
+import logging
+import time
+
+from config_data import config
+from utils import link_store
+
+
+ADMIN_REPORT_MIN_INTERVAL = 15 * 60        # не чаще одной сводки на задачу за столько секунд
+ADMIN_REPORT_REPEAT_AFTER = 24 * 60 * 60   # те же ошибки снова — напоминаем не раньше чем через сутки
+SAMPLE_CHATS = 5                           # сколько chat_id показывать на одну группу ошибок
+MAX_REPORT_LENGTH = 4000
+
+# потомок digest_bot: записи уходят в те же обработчики (utils/logger.py)
+logger = logging.getLogger("digest_bot.failures")
+
+
+class FailureAggregator:
+    """
+    Копит ошибки задачи (сбор, рассылка) по группам «источник + тип ошибки»
+    и отправляет админу одну короткую сводку: число, пример текста, примеры
+    chat_id. Между запусками помнит (kv в хранилище ссылок), что и когда уже
+    отправлялось: сводки не чаще ADMIN_REPORT_MIN_INTERVAL, повтор того же
+    набора ошибок — не чаще ADMIN_REPORT_REPEAT_AFTER.
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        # (source, тип ошибки) -> [count, пример текста, примеры chat_id]
+        self._groups: dict[tuple[str, str], list] = {}
+
+    def add(self, source: str, kind: str, message: str, chat_id=None) -> None:
+        group = self._groups.get((source, kind))
+        if group is None:
+            group = self._groups[(source, kind)] = [0, message, []]
+        group[0] += 1
+        if chat_id is not None and len(group[2]) < SAMPLE_CHATS:
+            group[2].append(str(chat_id))
+
+    def add_error(self, source: str, error: BaseException, chat_id=None) -> None:
+        self.add(source, type(error).__name__, str(error), chat_id)
+
+    def __bool__(self) -> bool:
+        return bool(self._groups)
+
+    @property
+    def total(self) -> int:
+        return sum(group[0] for group in self._groups.values())
+
+    def signature(self) -> str:
+        """Какие именно группы ошибок были (без счётчиков) — по нему и дедупим."""
+        keys = "|".join(f"{source}:{kind}" for source, kind in sorted(self._groups))
+        return hashlib.sha1(keys.encode("utf-8")).hexdigest()
+
+    def render(self) -> str:
+        lines = [f"⚠️ {html.escape(self.job)}: ошибок {self.total}"]
+        groups = sorted(self._groups.items(), key=lambda item: item[1][0], reverse=True)
+        for (source, kind), (count, sample, chats) in groups:
+            line = f"• {html.escape(source)} — {kind} ×{count}: {html.escape(sample[:200])}"
+            if chats:
+                more = ", …" if count > len(chats) else ""
+                line += f" (чаты: {', '.join(chats)}{more})"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        self._groups.clear()
+
+    def _decide(self, now: float, force: bool) -> str:
+        """'send', 'wait' (рано — копим дальше) или 'duplicate' (то же самое уже сообщали)."""
+        raw = link_store.kv_get(f"admin_report:{self.job}")
+        last = json.loads(raw) if raw else {}
+        sent_at = last.get("sent_at", 0.0)
+        if not force and now - sent_at < ADMIN_REPORT_MIN_INTERVAL:
+            return "wait"
+        if last.get("signature") == self.signature() and now - sent_at < ADMIN_REPORT_REPEAT_AFTER:
+            return "duplicate"
+        return "send"
+
+    async def report(self, bot, header: str | None = None, force: bool = False) -> bool:
+        """
+        Шлёт сводку админу. header — строка итогов задачи: с ним сообщение
+        уходит всегда (ошибки — подробно или одной строкой, если они те же,
+        что в прошлой сводке). Без header сводка уходит только по правилам
+        дедупа и лимита; если рано — ошибки копятся до следующего вызова.
+        force — ошибки подробно и мимо дедупа: для падения всей задачи, о
+        котором админ должен узнать при каждом запуске.
+        """
+        now = time.time()
+        if not self:
+            decision = "empty"
+        elif force:
+            decision = "send"
+        else:
+            decision = self._decide(now, force=header is not None)
+        if decision == "wait":
+            return False
+
+        lines = [header] if header else []
+        if decision == "send":
+            lines.append(self.render())
+        elif decision == "duplicate" and header:
+            lines.append(f"Ошибок {self.total}, те же, что в прошлой сводке")
+        signature = self.signature()
+        if decision != "empty":
+            self.clear()
+        if not lines:
+            return False
+
+        text = "\n".join(lines)
+        logger.warning(text)
+        try:
+            await bot.send_message(config.ADMIN_CHAT_ID, text[:MAX_REPORT_LENGTH])
+        except Exception as e:
+            logger.error(f"Не удалось отправить сводку админу: {e}")
+            return False
+        if decision == "send":
+            link_store.kv_set(f"admin_report:{self.job}", json.dumps({"signature": signature, "sent_at": now}))
+        return True
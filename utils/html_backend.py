@@ -0,0 +1,21 @@
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_BACKEND = "lxml"
+except ImportError:
+    DEFAULT_BACKEND = "html.parser"
+
+# HTML_PARSER=html.parser в окружении позволяет вернуться на чистый Python-парсер
+HTML_PARSER = os.getenv("HTML_PARSER", DEFAULT_BACKEND)
+
+
+def make_soup(html, only: SoupStrainer | None = None, backend: str | None = None) -> BeautifulSoup:
+    """
+    Строит дерево страницы выбранным бэкендом (по умолчанию lxml, если установлен).
+    only — SoupStrainer: в дерево попадут только нужные источнику узлы,
+    остальная разметка даже не материализуется.
+    """
+    return BeautifulSoup(html, backend or HTML_PARSER, parse_only=only)
@@ -0,0 +1,109 @@
+import hashlib
+import ssl
+from dataclasses import dataclass
+
+import aiohttp
+import certifi
+
+from utils import link_store
+from utils.profiling import stage
+
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+DEFAULT_TIMEOUT = 15
+
+_session: aiohttp.ClientSession | None = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Общая keep-alive сессия для всех источников.
+    Создаётся лениво, уже внутри работающего event loop.
+    """
+    global _session
+    if _session is None or _session.closed:
+        ssl_context = ssl.create_default_context(cafile=certifi.where())
+        connector = aiohttp.TCPConnector(
+            ssl=ssl_context,
+            limit=20,
+            limit_per_host=4,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers=HEADERS,
+            timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+        )
+    return _session
+
+
+async def close_session() -> None:
+    """Закрывает общую сессию (вызывается при остановке бота)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def fetch_text(url: str, **kwargs) -> str:
+    """GET-запрос, возвращает тело ответа как текст."""
+    with stage("fetch"):
+        async with get_session().get(url, **kwargs) as resp:
+            resp.raise_for_status()
+            return await resp.text()
+
+
+@dataclass
+class FetchedPage:
+    """Изменившаяся страница и её валидаторы — они сохраняются только через commit()."""
+
+    url: str
+    body: str | bytes
+    etag: str | None
+    last_modified: str | None
+    body_hash: str
+
+    def commit(self) -> None:
+        """
+        Запоминает валидаторы. Вызывать после того, как материалы страницы
+        записаны в архив: если разбор или запись упали, следующий опрос
+        снова получит тело, а не 304.
+        """
+        link_store.save_http_validators(self.url, self.etag, self.last_modified, self.body_hash)
+
+
+async def fetch_if_changed(url: str, *, binary: bool = False, **kwargs) -> FetchedPage | None:
+    """
+    Условный GET: шлёт If-None-Match/If-Modified-Since из прошлого ответа.
+    Возвращает None, если страница не изменилась — либо сервер ответил 304,
+    либо (если валидаторы он не поддерживает) тело совпало по sha256.
+    Тогда разбирать страницу заново не нужно.
+    Новые валидаторы не сохраняются сами — см. FetchedPage.commit().
+    """
+    cached = link_store.get_http_validators(url)
+    headers = dict(kwargs.pop("headers", None) or {})
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    with stage("fetch"):
+        async with get_session().get(url, headers=headers, **kwargs) as resp:
+            if resp.status == 304 and cached:
+                link_store.save_http_validators(url, *cached)
+                return None
+            resp.raise_for_status()
+            body = await resp.read()
+            text = None if binary else await resp.text()
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+
+    body_hash = hashlib.sha256(body).hexdigest()
+    if cached and cached[2] == body_hash:
+        # то же тело, что уже разобрано и записано, — обновляем только валидаторы
+        link_store.save_http_validators(url, etag, last_modified, body_hash)
+        return None
+    return FetchedPage(url, body if binary else text, etag, last_modified, body_hash)
@@ -0,0 +1,96 @@
+import asyncio
+import fcntl
+import os
+
+from config_data import config
+
+
+# Выбор ведущего среди воркеров и реплик: только ведущий собирает ссылки
+# и шлёт дайджест. Остальные раз в LEADER_RETRY_INTERVAL пробуют занять
+# место — если ведущий упал, его работу подхватит другой процесс.
+# Блокировка — файл рядом с хранилищем ссылок: ведущий работает с архивом,
+# историей и журналом рассылки в этом SQLite-файле, и стать ведущим может
+# только процесс, который видит тот же файл. Отсюда ограничение: все
+# воркеры и реплики — на одном хосте с общим каталогом STORE_PATH.
+LEADER_RETRY_INTERVAL = 15
+LEADER_LOCK_FILE = os.path.join(os.path.dirname(config.STORE_PATH), "leader.lock")
+
+
+class _FileLease:
+    """flock на файле: держится, пока открыт дескриптор, и снимается ядром, если процесс умер."""
+
+    def __init__(self, path: str = LEADER_LOCK_FILE):
+        self.path = path
+        self.fd = None
+
+    async def acquire(self) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    async def alive(self) -> bool:
+        return self.fd is not None
+
+    async def release(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)  # закрытие снимает flock
+            self.fd = None
+
+
+is_leader = False
+_lease = None
+_task: asyncio.Task | None = None
+
+
+async def _campaign_once(on_elected, on_lost) -> None:
+    global is_leader
+    if not is_leader:
+        try:
+            acquired = await _lease.acquire()
+        except Exception as e:
+            print(f"leader: не удалось проверить блокировку: {e}")
+            return
+        if acquired:
+            is_leader = True
+            print(f"leader: процесс {os.getpid()} стал ведущим")
+            await on_elected()
+    elif not await _lease.alive():
+        is_leader = False
+        print(f"leader: процесс {os.getpid()} потерял блокировку")
+        await _lease.release()
+        await on_lost()
+
+
+async def _campaign(on_elected, on_lost) -> None:
+    while True:
+        await asyncio.sleep(LEADER_RETRY_INTERVAL)
+        try:
+            await _campaign_once(on_elected, on_lost)
+        except Exception as e:
+            print(f"leader: {type(e).__name__}: {e}")
+
+
+async def start(on_elected, on_lost) -> None:
+    """
+    Первая попытка стать ведущим — сразу (on_elected отработает до возврата),
+    дальше — фоновой задачей. on_lost вызывается, если блокировка потеряна.
+    """
+    global _lease, _task
+    _lease = _FileLease()
+    await _campaign_once(on_elected, on_lost)
+    _task = asyncio.create_task(_campaign(on_elected, on_lost))
+
+
+async def stop() -> None:
+    global is_leader, _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+    if _lease is not None:
+        await _lease.release()
+    is_leader = False
@@ -0,0 +1,533 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from config_data import config
+from utils import near_dup
+
+
+ARTICLES = "articles"
+NEWS = "news"
+
+ARCHIVE_RETENTION_DAYS = 7
+# незавершённую рассылку продолжаем, только если она началась не раньше стольких часов назад
+BROADCAST_RESUME_HOURS = 6
+# материал из обхода вглубь (страницы 2+) без даты публикации считаем
+# настолько старым: время сбора у него «сейчас», но опубликован он давно
+BACKFILL_AGE_DAYS = 7
+
+# Старые плоские файлы: при первом запуске переносим их в базу
+LEGACY_FILES = {
+    "links.txt": (ARTICLES, False),
+    "links_news.txt": (NEWS, False),
+    "sent_articles.txt": (ARTICLES, True),
+    "sent_news.txt": (NEWS, True),
+}
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "yclid", "ysclid", "_openstat", "ref", "referrer", "from",
+}
+
+def link_fingerprint(link: str) -> int:
+    """64-битный отпечаток канонической ссылки — им история отправленного и хранится."""
+    return int.from_bytes(hashlib.blake2b(link.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def _sent_history_to_fingerprints(conn: sqlite3.Connection) -> None:
+    """
+    История отправленного: вместо полных ссылок и заголовков — 8-байтовые
+    отпечатки с датой отправки. Архиву тоже нужен отпечаток для сравнения.
+    """
+    conn.execute("ALTER TABLE links ADD COLUMN fp INTEGER")
+    conn.executemany(
+        "UPDATE links SET fp = ? WHERE link = ?",
+        [(link_fingerprint(link), link) for (link,) in conn.execute("SELECT link FROM links").fetchall()],
+    )
+    conn.execute("CREATE INDEX links_fp ON links (fp)")
+    conn.execute("""
+        CREATE TABLE sent_history (
+            fp INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            sent_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX sent_history_sent_at ON sent_history (sent_at)")
+    conn.executemany(
+        "INSERT OR REPLACE INTO sent_history (fp, kind, sent_at) VALUES (?, ?, ?)",
+        [(link_fingerprint(link), kind, sent_at)
+         for link, kind, sent_at in conn.execute("SELECT link, kind, sent_at FROM sent").fetchall()],
+    )
+    conn.execute("DROP TABLE sent")
+
+
+def _title_index(conn: sqlite3.Connection) -> None:
+    """
+    Индекс почти-дубликатов заголовков (MinHash + LSH, см. utils/near_dup.py):
+    подписи по отпечатку ссылки и ключи полос. links.dup_of — отпечаток
+    материала, который уже есть в архиве или истории под другой ссылкой.
+    """
+    conn.execute("""
+        CREATE TABLE title_sigs (
+            fp INTEGER PRIMARY KEY,
+            sig BLOB NOT NULL,
+            indexed_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE title_bands (
+            band_key INTEGER NOT NULL,
+            fp INTEGER NOT NULL,
+            PRIMARY KEY (band_key, fp)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX title_bands_fp ON title_bands (fp)")
+    conn.execute("ALTER TABLE links ADD COLUMN dup_of INTEGER")
+    # индекс наполняет _title_sources — по текущим правилам подписи
+
+
+def _reindex_titles(conn: sqlite3.Connection) -> None:
+    """
+    Пересобирает индекс почти-дубликатов по текущим правилам. Подписи
+    отправленного, которого уже нет в архиве, пересчитать не из чего — они
+    удаляются (от повтора той же ссылки защищает история).
+    """
+    conn.execute("DELETE FROM title_bands")
+    conn.execute("DELETE FROM title_sigs")
+    conn.execute("UPDATE links SET dup_of = NULL")
+    now = time.time()
+    rows = conn.execute("SELECT fp, title, source FROM links ORDER BY harvested_at").fetchall()
+    for fp, title, source in rows:
+        dup_of = _index_title(conn, fp, title, source, now)
+        if dup_of is not None:
+            conn.execute("UPDATE links SET dup_of = ? WHERE fp = ?", (dup_of, fp))
+
+
+def _title_sources(conn: sqlite3.Connection) -> None:
+    """
+    Подписи хранят источник и шинглы: дубликатом считается только материал
+    другого источника, и кандидат из LSH подтверждается точным Жаккаром.
+    Прежние dup_of ставились по оценке подписи — индекс пересобирается.
+    """
+    conn.execute("ALTER TABLE title_sigs ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+    conn.execute("ALTER TABLE title_sigs ADD COLUMN shingles TEXT NOT NULL DEFAULT ''")
+    _reindex_titles(conn)
+
+
+# Версионированная схема: i-й элемент переводит базу с версии i на i+1
+# (SQL-скрипт или функция, если нужно что-то посчитать на Python)
+SCHEMA = [
+    """
+    CREATE TABLE links (
+        link TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        source TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        harvested_at REAL NOT NULL
+    );
+    CREATE INDEX links_kind_harvested ON links (kind, harvested_at);
+    CREATE TABLE sent (
+        link TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        sent_at REAL NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE http_cache (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        body_hash TEXT NOT NULL,
+        checked_at REAL NOT NULL
+    );
+    """,
+    _sent_history_to_fingerprints,
+    _title_index,
+    """
+    CREATE TABLE broadcasts (
+        id INTEGER PRIMARY KEY,
+        payload TEXT NOT NULL,
+        started_at REAL NOT NULL,
+        finished_at REAL
+    );
+    CREATE TABLE deliveries (
+        broadcast_id INTEGER NOT NULL,
+        chat_id TEXT NOT NULL,
+        ok INTEGER NOT NULL,
+        PRIMARY KEY (broadcast_id, chat_id)
+    ) WITHOUT ROWID;
+    """,
+    """
+    ALTER TABLE links ADD COLUMN published_at REAL;
+    """,
+    """
+    CREATE TABLE kv (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    """,
+    # пересборка индекса по правилам того времени; теперь её делает _title_sources
+    "",
+    """
+    ALTER TABLE links ADD COLUMN backfill INTEGER NOT NULL DEFAULT 0;
+    """,
+    _title_sources,
+]
+
+_conn: sqlite3.Connection | None = None
+
+
+def canonical_url(url: str) -> str:
+    """
+    Приводит ссылку к каноническому виду, чтобы одна статья не жила под
+    разными адресами: без utm_* и прочих трекинговых параметров, без
+    #фрагмента и хвостового слэша, хост в нижнем регистре, query отсортирован.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def source_of(link: str) -> str:
+    """Ключ источника по хосту ссылки (vc, habr, sostav, dsgners)."""
+    host = urlsplit(link).netloc.lower()
+    for key, domain in (("vc", "vc.ru"), ("habr", "habr.com"), ("sostav", "sostav.ru"), ("dsgners", "dsgners.ru")):
+        if domain in host:
+            return key
+    return host or "web"
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for i, step in enumerate(SCHEMA[version:], start=version):
+        if callable(step):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {i + 1}")
+        else:
+            conn.executescript(f"BEGIN;\n{step}\nPRAGMA user_version = {i + 1};\nCOMMIT;")
+
+
+def _import_legacy_files(conn: sqlite3.Connection) -> None:
+    for path, (kind, is_sent) in LEGACY_FILES.items():
+        if not os.path.exists(path):
+            continue
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if " — " not in line:
+                    continue
+                title, link = line.rsplit(" — ", 1)
+                title = title.strip().strip("[]").strip()
+                if title and link.strip():
+                    entries.append((title, link))
+        if is_sent:
+            mark_sent(entries, kind, conn=conn)
+        else:
+            add_links(entries, kind, conn=conn)
+        os.replace(path, f"{path}.imported")
+
+
+def get_connection() -> sqlite3.Connection:
+    """Общее соединение с хранилищем ссылок (создаётся и мигрируется при первом обращении)."""
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(config.STORE_PATH, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        _migrate(conn)
+        _import_legacy_files(conn)
+        _conn = conn
+    return _conn
+
+
+def close() -> None:
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def find_near(conn: sqlite3.Connection, tokens: set[str], source: str, exclude_fp: int | None = None) -> int | None:
+    """
+    Отпечаток проиндексированного заголовка другого источника, почти
+    совпадающего с шинглами tokens, или None. Кандидаты — только те, что
+    делят с подписью хотя бы одну LSH-полосу (поиск по индексу), поэтому цена
+    не зависит от размера архива; каждый подтверждается точным Жаккаром.
+    """
+    keys = near_dup.band_keys(near_dup.signature(tokens))
+    rows = conn.execute(
+        f"""
+        SELECT DISTINCT s.fp, s.shingles FROM title_bands b JOIN title_sigs s ON s.fp = b.fp
+        WHERE b.band_key IN ({", ".join("?" * len(keys))}) AND s.source != ?
+        """,
+        (*keys, source),
+    ).fetchall()
+    for fp, stored in rows:
+        if fp != exclude_fp and near_dup.is_near(tokens, near_dup.load_shingles(stored)):
+            return fp
+    return None
+
+
+def _index_title(conn: sqlite3.Connection, fp: int, title: str, source: str, now: float) -> int | None:
+    """
+    Добавляет заголовок в индекс почти-дубликатов; возвращает отпечаток
+    найденного до этого двойника с другого источника (или None).
+    """
+    tokens = near_dup.index_shingles(title)
+    if tokens is None:
+        return None
+    sig = near_dup.signature(tokens)
+    dup_of = find_near(conn, tokens, source, exclude_fp=fp)
+    conn.execute(
+        "INSERT OR IGNORE INTO title_sigs (fp, sig, indexed_at, source, shingles) VALUES (?, ?, ?, ?, ?)",
+        (fp, near_dup.pack(sig), now, source, near_dup.dump_shingles(tokens)),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO title_bands (band_key, fp) VALUES (?, ?)",
+        [(key, fp) for key in near_dup.band_keys(sig)],
+    )
+    return dup_of
+
+
+def add_links(entries, kind: str, conn=None, backfill: bool = False) -> list[tuple[str, str]]:
+    """
+    Пакетно добавляет (title, link) или (title, link, published_at) в архив
+    одной транзакцией (published_at — unix-время публикации, если источник его отдаёт).
+    backfill — материалы со старых страниц листинга (utils/crawler.py): без
+    даты публикации они не считаются свежими (см. iter_unsent).
+    Возвращает только действительно новые пары (с каноническими ссылками).
+    Почти-дубликаты уже известных материалов другого источника (та же
+    новость на другом сайте) попадают в архив с dup_of и в дайджест не идут.
+    """
+    conn = conn or get_connection()
+    now = time.time()
+    new = []
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for title, link, *published_at in entries:
+            link = canonical_url(link)
+            fp = link_fingerprint(link)
+            source = source_of(link)
+            cur = conn.execute(
+                """
+                INSERT OR IGNORE INTO links (link, title, source, kind, harvested_at, fp, published_at, backfill)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (link, title, source, kind, now, fp, published_at[0] if published_at else None, int(backfill)),
+            )
+            if not cur.rowcount:
+                continue
+            dup_of = _index_title(conn, fp, title, source, now)
+            if dup_of is None:
+                new.append((title, link))
+            else:
+                conn.execute("UPDATE links SET dup_of = ? WHERE link = ?", (dup_of, link))
+    return new
+
+
+def iter_unsent(kind: str, conn=None):
+    """
+    Курсор по (title, link, source, published_at) архива данного типа, которые
+    не отправлялись за последние config.SENT_RETENTION_DAYS дней и не дублируют
+    другие материалы. Строки читаются по одной, весь архив в память не грузится.
+    Если источник не отдал дату публикации — берём время сбора, а для
+    собранного обходом вглубь — время сбора минус BACKFILL_AGE_DAYS.
+    """
+    conn = conn or get_connection()
+    return conn.execute(
+        """
+        SELECT l.title, l.link, l.source, COALESCE(l.published_at, l.harvested_at - l.backfill * ?) FROM links l
+        WHERE l.kind = ? AND l.dup_of IS NULL AND NOT EXISTS (
+            SELECT 1 FROM sent_history s WHERE s.fp = l.fp AND s.sent_at >= ?
+        )
+        """,
+        (BACKFILL_AGE_DAYS * 86400, kind, _sent_cutoff()),
+    )
+
+
+def unsent(kind: str, conn=None) -> list[tuple[str, str, str]]:
+    """Все (title, link, source) из iter_unsent списком."""
+    return [(title, link, source) for title, link, source, _ in iter_unsent(kind, conn)]
+
+
+def _sent_cutoff() -> float:
+    return time.time() - config.SENT_RETENTION_DAYS * 86400
+
+
+def _mark_sent(conn: sqlite3.Connection, chosen, kind: str, now: float) -> None:
+    rows = [(link_fingerprint(canonical_url(link)), title) for title, link in chosen]
+    conn.executemany(
+        """
+        INSERT INTO sent_history (fp, kind, sent_at) VALUES (?, ?, ?)
+        ON CONFLICT (fp) DO UPDATE SET sent_at = excluded.sent_at
+        """,
+        [(fp, kind, now) for fp, _ in rows],
+    )
+    for fp, title in rows:
+        _index_title(conn, fp, title, now)
+
+
+def mark_sent(chosen, kind: str, conn=None) -> None:
+    """
+    Добавляет выбранные (title, link) в историю отправленных одной транзакцией.
+    Заголовки остаются в индексе почти-дубликатов, пока жива запись истории.
+    """
+    if not chosen:
+        return
+    conn = conn or get_connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _mark_sent(conn, chosen, kind, time.time())
+
+
+def start_broadcast(payload: dict, chosen: dict[str, list], conn=None) -> int:
+    """
+    Заводит запись рассылки с её содержимым (payload) и в той же транзакции
+    пишет chosen ({kind: [(title, link)]}) в историю отправленных: после
+    падения рассылка продолжается с тем же дайджестом, а не собирается заново.
+    Брошенные незавершённые рассылки при этом закрываются.
+    """
+    conn = conn or get_connection()
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE broadcasts SET finished_at = ? WHERE finished_at IS NULL", (now,))
+        cur = conn.execute(
+            "INSERT INTO broadcasts (payload, started_at) VALUES (?, ?)",
+            (json.dumps(payload, ensure_ascii=False), now),
+        )
+        for kind, items in chosen.items():
+            _mark_sent(conn, items, kind, now)
+    return cur.lastrowid
+
+
+def unfinished_broadcast(conn=None) -> tuple[int, dict] | None:
+    """(id, payload) рассылки, прерванной не позже BROADCAST_RESUME_HOURS назад, или None."""
+    conn = conn or get_connection()
+    row = conn.execute(
+        """
+        SELECT id, payload FROM broadcasts
+        WHERE finished_at IS NULL AND started_at >= ?
+        ORDER BY id DESC LIMIT 1
+        """,
+        (time.time() - BROADCAST_RESUME_HOURS * 3600,),
+    ).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+
+def record_delivery(broadcast_id: int, chat_id, ok: bool, conn=None) -> None:
+    """Отметка по одному чату — сразу после отправки (WAL + synchronous=NORMAL, это дёшево)."""
+    conn = conn or get_connection()
+    conn.execute(
+        "INSERT OR REPLACE INTO deliveries (broadcast_id, chat_id, ok) VALUES (?, ?, ?)",
+        (broadcast_id, str(chat_id), int(ok)),
+    )
+
+
+def is_delivered(broadcast_id: int, chat_id, conn=None) -> bool:
+    """Чат уже обработан в этой рассылке (доставлено или окончательная ошибка)."""
+    conn = conn or get_connection()
+    return conn.execute(
+        "SELECT 1 FROM deliveries WHERE broadcast_id = ? AND chat_id = ?", (broadcast_id, str(chat_id))
+    ).fetchone() is not None
+
+
+def finish_broadcast(broadcast_id: int, chosen: dict[str, list], conn=None) -> None:
+    """
+    Закрывает рассылку и в той же транзакции дописывает в историю то, что
+    попало в варианты, отрендеренные уже по ходу рассылки.
+    """
+    conn = conn or get_connection()
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for kind, items in chosen.items():
+            _mark_sent(conn, items, kind, now)
+        conn.execute("UPDATE broadcasts SET finished_at = ? WHERE id = ?", (now, broadcast_id))
+
+
+def prune_archive(days: float = ARCHIVE_RETENTION_DAYS, conn=None) -> int:
+    """Удаляет из архива всё, что собрано раньше чем days дней назад."""
+    conn = conn or get_connection()
+    with conn:
+        cur = conn.execute("DELETE FROM links WHERE harvested_at < ?", (time.time() - days * 86400,))
+    return cur.rowcount
+
+
+def compact(conn=None) -> tuple[int, int]:
+    """
+    Периодическое обслуживание: чистит архив и историю старше окна хранения
+    и сжимает WAL. Возвращает (удалено из архива, удалено из истории).
+    """
+    conn = conn or get_connection()
+    pruned = prune_archive(conn=conn)
+    with conn:
+        cur = conn.execute("DELETE FROM sent_history WHERE sent_at < ?", (_sent_cutoff(),))
+        # индекс заголовков живёт, пока материал есть в архиве или в истории
+        conn.execute("""
+            DELETE FROM title_sigs WHERE fp NOT IN (SELECT fp FROM links WHERE fp IS NOT NULL)
+                AND fp NOT IN (SELECT fp FROM sent_history)
+        """)
+        conn.execute("DELETE FROM title_bands WHERE fp NOT IN (SELECT fp FROM title_sigs)")
+        # журнал рассылок нужен только для продолжения — храним столько же, сколько архив
+        old = time.time() - ARCHIVE_RETENTION_DAYS * 86400
+        conn.execute(
+            "DELETE FROM deliveries WHERE broadcast_id IN (SELECT id FROM broadcasts WHERE started_at < ?)", (old,)
+        )
+        conn.execute("DELETE FROM broadcasts WHERE started_at < ?", (old,))
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return pruned, cur.rowcount
+
+
+def get_http_validators(url: str, conn=None) -> tuple[str | None, str | None, str] | None:
+    """(etag, last_modified, body_hash) с прошлого запроса url или None."""
+    conn = conn or get_connection()
+    return conn.execute(
+        "SELECT etag, last_modified, body_hash FROM http_cache WHERE url = ?", (url,)
+    ).fetchone()
+
+
+def save_http_validators(url: str, etag: str | None, last_modified: str | None, body_hash: str, conn=None) -> None:
+    conn = conn or get_connection()
+    conn.execute(
+        """
+        INSERT INTO http_cache (url, etag, last_modified, body_hash, checked_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (url) DO UPDATE SET
+            etag = excluded.etag, last_modified = excluded.last_modified,
+            body_hash = excluded.body_hash, checked_at = excluded.checked_at
+        """,
+        (url, etag, last_modified, body_hash, time.time()),
+    )
+
+
+def kv_get(key: str, conn=None) -> str | None:
+    """Мелкое служебное состояние между запусками (например, когда слали сводку админу)."""
+    conn = conn or get_connection()
+    row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def kv_set(key: str, value: str, conn=None) -> None:
+    conn = conn or get_connection()
+    conn.execute(
+        """
+        INSERT INTO kv (key, value, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        """,
+        (key, value, time.time()),
+    )
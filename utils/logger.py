@@ -1,48 +1,180 @@
-# import logging
-# from datetime import datetime
-# from zoneinfo import ZoneInfo  # стандартный модуль
-#
-#
-# class MoscowTimeFormatter(logging.Formatter):
-#     def formatTime(self, record, datefmt=None):
-#         dt = datetime.fromtimestamp(record.created, tz=ZoneInfo("Europe/Moscow"))
-#         return dt.strftime(datefmt or "%m-%d %H:%M")
-#
-#
-# class NoHTTPFilter(logging.Filter):
-#     def filter(self, record):
-#         message = record.getMessage()
-#         unwanted_phrases = [
-#             'Bad request syntax',
-#             'Bad HTTP/0.9 request type',
-#             'Invalid HTTP version',
-#             'code 400',
-#             'code 505'
-#         ]
-#         return not any(phrase in message for phrase in unwanted_phrases)
-#
-#
-# logger = logging.getLogger()
-# logger.setLevel(logging.WARNING)
-#
-#
-# file_handler = logging.FileHandler('bot.log', mode='a')
-# file_handler.setFormatter(MoscowTimeFormatter(
-#     fmt='%(asctime)s - %(message)s',
-#     datefmt='%m-%d %H:%M'
-# ))
-# file_handler.addFilter(NoHTTPFilter())
-#
-#
-# console_handler = logging.StreamHandler()
-# console_handler.setFormatter(logging.Formatter(
-#     fmt='%(asctime)s - %(message)s',
-#     datefmt='%m-%d %H:%M'
-# ))
-#
-#
-# logger.addHandler(file_handler)
-# logger.addHandler(console_handler)
-#
-#
-# logging.getLogger('werkzeug').setLevel(logging.ERROR)
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from zoneinfo import ZoneInfo  # стандартный модуль
+
+
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_BATCH_SIZE = 100          # сколько записей копим перед записью на диск
+LOG_FLUSH_INTERVAL = 1.0      # и не дольше стольких секунд
+# доля INFO-записей, которые пишем (WARNING и выше — всегда)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+
+class MoscowTimeFormatter(logging.Formatter):
+    def formatTime(self, record, datefmt=None):
+        dt = datetime.fromtimestamp(record.created, tz=ZoneInfo("Europe/Moscow"))
+        return dt.strftime(datefmt or "%m-%d %H:%M")
+
+
+class JsonFormatter(MoscowTimeFormatter):
+    """Одна запись — одна JSON-строка; поля из extra={"fields": {...}} попадают в неё как есть."""
+
+    def format(self, record):
+        payload = {
+            "time": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class NoHTTPFilter(logging.Filter):
+    def filter(self, record):
+        message = record.getMessage()
+        unwanted_phrases = [
+            'Bad request syntax',
+            'Bad HTTP/0.9 request type',
+            'Invalid HTTP version',
+            'code 400',
+            'code 505'
+        ]
+        return not any(phrase in message for phrase in unwanted_phrases)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только rate долю записей ниже WARNING."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler, который пишет на диск пачками: записи копятся
+    в буфере и сбрасываются одним write + flush (ротация — по размеру файла).
+    """
+
+    def __init__(self, *args, batch_size: int = LOG_BATCH_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size
+        self._buffer: list[str] = []
+
+    def emit(self, record):
+        try:
+            self._buffer.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if not self._buffer:
+                return
+            data, self._buffer = "".join(self._buffer), []
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() + len(data.encode(self.encoding or "utf-8")) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(data)
+            self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Кладёт запись в очередь как есть: форматирование — уже в потоке listener'а."""
+
+    def prepare(self, record):
+        return record
+
+
+class _FlushingQueueListener(QueueListener):
+    """Если очередь затихла — сбрасываем накопленные пачки на диск."""
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=LOG_FLUSH_INTERVAL)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+
+file_handler = BatchedRotatingFileHandler(
+    LOG_FILE, mode='a', maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+)
+file_handler.setFormatter(JsonFormatter())
+file_handler.addFilter(NoHTTPFilter())
+
+
+# в консоль — только предупреждения и ошибки, аудит пишется в файл
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.WARNING)
+console_handler.setFormatter(MoscowTimeFormatter(
+    fmt='%(asctime)s - %(message)s',
+    datefmt='%m-%d %H:%M'
+))
+
+
+# В event loop остаётся только put_nowait в очередь; запись — в отдельном потоке
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = _DeferredQueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+listener = _FlushingQueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+listener.start()
+
+
+def stop_listener():
+    listener.stop()
+    file_handler.close()
+
+
+atexit.register(stop_listener)
+
+
+def use_worker_log(index: int) -> None:
+    """
+    Вызывается в воркере вебхука сразу после fork: поток записи родителя
+    в дочерний процесс не переходит, а ротация одного файла из нескольких
+    процессов небезопасна — у каждого воркера свой файл и свой listener.
+    """
+    global log_queue, listener
+    file_handler._buffer = []  # записи родителя остаются родителю
+    if file_handler.stream is not None:
+        file_handler.stream.close()
+        file_handler.stream = None
+    file_handler.baseFilename = os.path.abspath(f"{LOG_FILE}.worker{index}")
+
+    log_queue = queue.SimpleQueue()
+    queue_handler.queue = log_queue
+    listener = _FlushingQueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+
+
+logger = logging.getLogger("digest_bot")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+logger.addHandler(queue_handler)
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+
+
+MEDIA_CACHE_FILE = "media_cache.json"
+
+
+class MediaCache:
+    """
+    Кэш file_id загруженных в Telegram картинок.
+    Файл заливается один раз, дальше отправляется по file_id.
+    Запись привязана к sha256 содержимого: поменялась картинка — заливаем заново.
+    Кэш хранится в JSON и переживает перезапуски.
+    """
+
+    def __init__(self, cache_file: str = MEDIA_CACHE_FILE):
+        self.cache_file = cache_file
+        self._data = self._load()
+        self._hashes: dict[str, tuple[int, int, str]] = {}
+        self._lock = asyncio.Lock()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        tmp = f"{self.cache_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.cache_file)
+
+    def file_hash(self, path: str) -> str:
+        """sha256 файла; пересчитывается только если изменились размер или mtime."""
+        st = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def get(self, path: str) -> str | None:
+        entry = self._data.get(os.path.abspath(path))
+        if entry and entry.get("sha256") == self.file_hash(path):
+            return entry.get("file_id")
+        return None
+
+    def put(self, path: str, file_id: str) -> None:
+        self._data[os.path.abspath(path)] = {"sha256": self.file_hash(path), "file_id": file_id}
+        self._save()
+
+    def invalidate(self, path: str) -> None:
+        if self._data.pop(os.path.abspath(path), None) is not None:
+            self._save()
+
+    async def send_photo(self, bot, chat_id, path: str, **kwargs):
+        """
+        Отправляет картинку: по file_id, если он уже есть, иначе заливает файл.
+        При параллельной рассылке заливка идёт ровно один раз — остальные
+        отправки ждут её и получают готовый file_id.
+        """
+        file_id = self.get(path)
+        if file_id:
+            try:
+                return await bot.send_photo(chat_id, photo=file_id, **kwargs)
+            except TelegramBadRequest as e:
+                # file_id протух на стороне Telegram — забываем и заливаем заново
+                if "file" not in str(e).lower():
+                    raise
+                self.invalidate(path)
+
+        async with self._lock:
+            file_id = self.get(path)
+            if file_id:
+                return await bot.send_photo(chat_id, photo=file_id, **kwargs)
+            message = await bot.send_photo(chat_id, photo=FSInputFile(path), **kwargs)
+            self.put(path, message.photo[-1].file_id)
+            return message
+
+
+media_cache = MediaCache()
@@ -0,0 +1,61 @@
+import os
+
+from aiohttp import web
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+
+# Несколько воркеров (WEB_WORKERS > 1): каждый пишет значения в свои файлы в
+# PROMETHEUS_MULTIPROC_DIR, /metrics любого воркера собирает их все вместе.
+# Переменная должна быть задана до импорта prometheus_client (см. main.py).
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+FETCH_SECONDS = Histogram(
+    "digest_fetch_seconds", "Время опроса источника (запрос + разбор)", ["source"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30),
+)
+FETCH_ITEMS = Counter("digest_fetch_items_total", "Новых материалов с источника", ["source"])
+FETCH_ERRORS = Counter("digest_fetch_errors_total", "Ошибки опроса источника", ["source", "error"])
+PARSE_SECONDS = Histogram(
+    "digest_parse_seconds", "Время разбора страницы/ленты", ["source"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+DIGEST_BUILD_SECONDS = Histogram("digest_build_seconds", "Сборка текста дайджеста")
+
+BROADCAST_SECONDS = Histogram(
+    "digest_broadcast_seconds", "Длительность рассылки целиком",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+BROADCAST_RATE = Gauge(
+    "digest_broadcast_rate", "Скорость последней рассылки, сообщений/с", multiprocess_mode="mostrecent",
+)
+SEND_TOTAL = Counter("digest_send_total", "Отправки в рассылке", ["result"])
+SEND_ERRORS = Counter("digest_send_errors_total", "Неудачные отправки по типу ошибки", ["error"])
+
+DB_POOL_SIZE = Gauge("digest_db_pool_size", "Соединений в пуле asyncpg", multiprocess_mode="livesum")
+DB_POOL_IDLE = Gauge("digest_db_pool_idle", "Свободных соединений в пуле asyncpg", multiprocess_mode="livesum")
+
+UPDATE_SECONDS = Histogram(
+    "digest_update_handling_seconds", "Обработка входящего апдейта Telegram", ["event"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+COLD_START_SECONDS = Gauge(
+    "digest_cold_start_seconds", "Секунд от запуска процесса до этапа старта", ["stage"], multiprocess_mode="liveall",
+)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """GET /metrics в формате Prometheus (при нескольких воркерах — сумма по всем)."""
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return web.Response(body=generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Значения live*-метрик завершившегося воркера больше не учитываются."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,111 @@
+import hashlib
+import random
+import re
+import struct
+
+
+# Поиск почти-дубликатов заголовков: шинглы (основы слов) -> MinHash-подпись
+# из NUM_PERM чисел -> LSH: BANDS полос по ROWS чисел. Вероятность совпасть
+# хотя бы в одной полосе — 1 - (1 - J^ROWS)^BANDS: ~0.67 при J=0.6, ~0.89 при
+# J=0.7 (порог), ~0.99 при J=0.8. Полосы только находят кандидатов по индексу,
+# а не перебором архива; решение — по точному Жаккару шинглов: оценка по 32
+# числам ошибается на ±0.08, и шаблонные заголовки разных историй
+# («… для Авито» / «… для Ozon») проходили бы порог.
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+JACCARD_THRESHOLD = 0.7
+STEM_LENGTH = 6
+MIN_WORD_LENGTH = 3
+# меньше шинглов — заголовок слишком короткий («Дайджест №42»), чтобы по нему
+# судить о дубликатах: такие подписи совпадают друг с другом почти всегда
+MIN_SHINGLES = 3
+# заглушка парсеров для материала без заголовка — в индекс не попадает
+NO_TITLE = "Нет заголовка"
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rnd = random.Random(20240901)  # фиксированное зерно: подписи совместимы между запусками
+_PERMUTATIONS = [(_rnd.randrange(1, _PRIME), _rnd.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_SIG_FORMAT = f">{NUM_PERM}I"
+_WORD_RX = re.compile(r"\w+", re.U)
+# служебные слова не отличают одну историю от другой, а в коротком
+# заголовке заметно поднимают сходство шаблонных формулировок
+STOP_WORDS = frozenset({
+    "как", "для", "что", "это", "эти", "этот", "или", "при", "над", "под", "без", "про",
+    "его", "она", "они", "оно", "все", "всё", "так", "уже", "еще", "ещё", "чем", "где", "кто",
+    "зачем", "почему", "когда", "тоже", "также", "через", "после", "перед", "между", "свой",
+    "своих", "наш", "наши", "ваш", "чтобы", "если", "только", "будет", "был", "была", "были",
+    "the", "and", "for", "with", "how", "from", "what", "why", "you", "your",
+})
+
+
+def shingles(title: str) -> set[str]:
+    """
+    Основы значимых слов заголовка: нижний регистр, ё -> е, без пунктуации,
+    короткие и служебные слова отброшены, длинные обрезаны до STEM_LENGTH
+    (грубый стемминг). Числа остаются целиком: «выпуск 42» и «выпуск 43» —
+    разные материалы.
+    """
+    words = _WORD_RX.findall(title.lower().replace("ё", "е"))
+    return {
+        w if w.isdigit() else w[:STEM_LENGTH]
+        for w in words
+        if w.isdigit() or (len(w) >= MIN_WORD_LENGTH and w not in STOP_WORDS)
+    }
+
+
+def index_shingles(title: str) -> set[str] | None:
+    """Шинглы заголовка для индекса; None — заглушка или меньше MIN_SHINGLES значимых слов."""
+    if title.strip() == NO_TITLE:
+        return None
+    tokens = shingles(title)
+    return tokens if len(tokens) >= MIN_SHINGLES else None
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def signature(tokens: set[str]) -> tuple[int, ...]:
+    """MinHash-подпись непустого набора шинглов (см. index_shingles)."""
+    hashes = [_token_hash(t) for t in tokens]
+    return tuple(
+        min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    )
+
+
+def band_keys(sig: tuple[int, ...]) -> list[int]:
+    """Ключи LSH-полос (знаковые 64-битные — для INTEGER в SQLite)."""
+    keys = []
+    for band in range(BANDS):
+        chunk = struct.pack(f">I{ROWS}I", band, *sig[band * ROWS:(band + 1) * ROWS])
+        keys.append(int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "big", signed=True))
+    return keys
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    """Точный коэффициент Жаккара двух наборов шинглов."""
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def is_near(a: set[str], b: set[str]) -> bool:
+    return jaccard(a, b) >= JACCARD_THRESHOLD
+
+
+def dump_shingles(tokens: set[str]) -> str:
+    """Шинглы для хранения одной строкой (пробелов в шинглах нет)."""
+    return " ".join(sorted(tokens))
+
+
+def load_shingles(raw: str) -> set[str]:
+    return set(raw.split())
+
+
+def pack(sig: tuple[int, ...]) -> bytes:
+    return struct.pack(_SIG_FORMAT, *sig)
+
+
+def unpack(blob: bytes) -> tuple[int, ...]:
+    return struct.unpack(_SIG_FORMAT, blob)
@@ -1,72 +1,97 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import calendar
+import logging
+import time
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from bs4 import SoupStrainer
+import soupsieve
 import os
-import random
+from collections import defaultdict
 from urllib.parse import urljoin, urlsplit, urlunsplit, urlparse
 import feedparser
-import certifi
 import re
 from loader import bot
-from pg_maker import all_users
-from aiogram.types import FSInputFile
-
-
-HEADERS = {"User-Agent": "Mozilla/5.0"}
-
-
-def load_seen_links(file_name):
-    if not os.path.exists(file_name):
-        return set()
-    with open(file_name, "r", encoding="utf-8") as f:
-        return set(
-            line.strip().rsplit(" — ", 1)[-1]
-            for line in f if " — " in line
-        )
-
-
-def save_seen_links(entries, file_name):
-    with open(file_name, "a", encoding="utf-8") as f:
-        for title, link, source in entries:
-            f.write(f"{title} — {link}\n")
-
-
-async def fetch_sostav():
-    URL = "https://www.sostav.ru/news/digital"
+from pg_maker import active_exclusions, iter_subscribers, record_failures
+from utils.broadcast import aiterate, broadcast
+from utils.crawler import CrawlTarget
+from utils.failures import FailureAggregator
+from utils import link_store, near_dup
+from utils.sampling import WeightedReservoir, recency_weight
+from utils.html_backend import make_soup
+from utils.http_client import fetch_if_changed
+from utils.media_cache import media_cache
+from utils.preferences import dump_excluded, parse_excluded
+from utils.profiling import stage
+from utils.metrics import (
+    DIGEST_BUILD_SECONDS, FETCH_ERRORS, FETCH_ITEMS, FETCH_SECONDS, PARSE_SECONDS,
+)
+
+
+SOURCE_TIMEOUT = 20
+
+# потомок digest_bot: записи уходят в те же обработчики (utils/logger.py)
+logger = logging.getLogger("digest_bot.parser")
+
+
+async def _parse(source, func, *args):
+    """Разбор страницы — CPU-работа: уводим её из event loop и меряем время."""
+    with PARSE_SECONDS.labels(source).time(), stage("parse"):
+        return await asyncio.to_thread(func, *args)
+
+
+# Правила извлечения компилируются один раз при импорте:
+# strainer'ы ограничивают дерево нужными узлами, селекторы не парсятся заново
+_SOSTAV_ONLY = SoupStrainer("a", class_="title")
+_VC_ONLY = SoupStrainer("div", class_="content content--short")
+_DSGNERS_CARDS_ONLY = SoupStrainer("article")
+_DSGNERS_LINKS_ONLY = SoupStrainer("a", href=True)
+_ANCHOR_WITH_HREF = soupsieve.compile("a[href]")
+# классы span с заголовком в dsgners, по убыванию приоритета
+_DSGNERS_TITLE_CLASSES = (
+    "line-clamp-3",
+    "h2",
+    "group-hover:text-text-tertiary",
+    "group-hover:text-text-primary",
+)
+
+
+def parse_sostav(html):
+    """Разбирает листинг sostav.ru -> [(title, link), ...]."""
     BASE_URL = "https://www.sostav.ru"
-    SEEN_FILE_SOSTAV = "links_news.txt"
-
-    response = requests.get(URL, headers=HEADERS)
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    seen_links = load_seen_links(SEEN_FILE_SOSTAV)
-    new_articles = []
 
+    soup = make_soup(html, only=_SOSTAV_ONLY)
+    out = []
     for news in soup.find_all("a", class_="title"):
         title = news.text.strip()
         relative_link = news.get("href", "")
-        full_link = BASE_URL + relative_link
+        out.append((title, BASE_URL + relative_link))
+    return out
 
-        if full_link not in seen_links:
-            new_articles.append((title, full_link, "Sostav"))
 
-    save_seen_links(new_articles, SEEN_FILE_SOSTAV)
-    return new_articles
+async def fetch_sostav():
+    URL = "https://www.sostav.ru/news/digital"
 
+    page = await fetch_if_changed(URL)
+    if page is None:
+        # страница не менялась с прошлого опроса — разбирать нечего
+        return []
+    items = await _parse("sostav", parse_sostav, page.body)
 
-async def fetch_vc():
-    URL = "https://vc.ru/design"
-    BASE_URL = "https://vc.ru"
-    SEEN_FILE_VC = "links.txt"
+    new = link_store.add_links(items, link_store.NEWS)
+    page.commit()
+    return [(title, link, "Sostav") for title, link in new]
 
-    response = requests.get(URL, headers=HEADERS)
-    soup = BeautifulSoup(response.text, "html.parser")
-    seen_links = load_seen_links(SEEN_FILE_VC)
 
-    new_articles = []
+def parse_vc(html):
+    """Разбирает листинг vc.ru -> [(title, link), ...]."""
+    BASE_URL = "https://vc.ru"
 
+    soup = make_soup(html, only=_VC_ONLY)
+    out = []
     for article in soup.find_all("div", class_="content content--short"):
         title_block = article.find("div", class_="content-title")
-        title = title_block.get_text(strip=True) if title_block else "Нет заголовка"
+        title = title_block.get_text(strip=True) if title_block else near_dup.NO_TITLE
 
         link_tag = article.find("a", class_="content__link")
         href = link_tag.get("href") if link_tag else ""
@@ -74,33 +99,44 @@ async def fetch_vc():
 
         if not full_link:
             continue
+        out.append((title, full_link))
+    return out
 
-        if full_link not in seen_links:
-            new_articles.append((title, full_link, "VC"))
 
-    save_seen_links(new_articles, SEEN_FILE_VC)
-    return new_articles
+async def fetch_vc():
+    URL = "https://vc.ru/design"
 
+    page = await fetch_if_changed(URL)
+    if page is None:
+        return []
+    items = await _parse("vc", parse_vc, page.body)
 
-async def fetch_habr():
-    rss_url = "https://habr.com/ru/rss/flows/design/articles/?fl=ru"
-    SEEN_FILE_HABR = "links.txt"
+    new = link_store.add_links(items, link_store.ARTICLES)
+    page.commit()
+    return [(title, link, "VC") for title, link in new]
 
-    seen_links = load_seen_links(SEEN_FILE_HABR)
-    response = requests.get(rss_url, verify=certifi.where())
-    feed = feedparser.parse(response.content)
 
-    new_articles = []
+def parse_habr(content):
+    """Разбирает RSS-ленту Хабра -> [(title, link, published_at), ...] (published_at — unix-время или None)."""
+    feed = feedparser.parse(content)
+    return [
+        (entry.title.strip(), entry.link.strip(),
+         calendar.timegm(entry.published_parsed) if entry.get("published_parsed") else None)
+        for entry in feed.entries
+    ]
 
-    for entry in feed.entries:
-        title = entry.title.strip()
-        link = entry.link.strip()
 
-        if link not in seen_links:
-            new_articles.append((title, link, "Habr"))
+async def fetch_habr():
+    rss_url = "https://habr.com/ru/rss/flows/design/articles/?fl=ru"
 
-    save_seen_links(new_articles, SEEN_FILE_HABR)
-    return new_articles
+    page = await fetch_if_changed(rss_url, binary=True)
+    if page is None:
+        return []
+    items = await _parse("habr", parse_habr, page.body)
+
+    new = link_store.add_links(items, link_store.ARTICLES)
+    page.commit()
+    return [(title, link, "Habr") for title, link in new]
 
 _ARTICLE_RX = re.compile(r"^https?://dsgners\.ru/[^/]+/\d+-", re.I)
 
@@ -114,6 +150,22 @@ def _strip_fragment(url: str) -> str:
     parts[4] = ""  # fragment
     return urlunsplit(parts)
 
+def _find_title_span(a_tag):
+    """
+    Один проход по <span> внутри ссылки вместо четырёх select_one:
+    первый в порядке документа span самого приоритетного класса.
+    """
+    best, best_rank = None, len(_DSGNERS_TITLE_CLASSES)
+    for span in a_tag.find_all("span"):
+        classes = span.get("class") or ()
+        for rank in range(best_rank):
+            if _DSGNERS_TITLE_CLASSES[rank] in classes:
+                best, best_rank = span, rank
+                break
+        if best_rank == 0:
+            break
+    return best
+
 def _extract_clean_title(a_tag) -> str:
     """
     Пытаемся найти нормальный заголовок:
@@ -123,9 +175,7 @@ def _extract_clean_title(a_tag) -> str:
     4) запасной вариант: самый длинный текстовый фрагмент внутри <a>
     """
     # 1) самый частый вариант на dsgners.ru
-    span = a_tag.select_one("span.line-clamp-3") or a_tag.select_one("span.h2") \
-           or a_tag.select_one("span.group-hover\\:text-text-tertiary") \
-           or a_tag.select_one("span.group-hover\\:text-text-primary")
+    span = _find_title_span(a_tag)
     if span:
         t = span.get_text(" ", strip=True)
         if t:
@@ -148,40 +198,14 @@ def _extract_clean_title(a_tag) -> str:
     return max(texts, key=len) if texts else ""
 
 
-async def fetch_dsgners(articles=True):
-    URL = "https://dsgners.ru/" if articles else "https://dsgners.ru/news"
+def parse_dsgners(html):
+    """Разбирает главную/новости dsgners.ru -> [(title, link), ...]."""
     BASE = "https://dsgners.ru/"
-    SEEN_FILE = "links.txt" if articles else "links_news.txt"
-
-    resp = requests.get(URL, headers=HEADERS, timeout=15)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
 
-    seen = load_seen_links(SEEN_FILE)
     out, seen_now = [], set()
 
-    # 1) основные карточки
-    for a in soup.select("article a[href]"):
-        href = a["href"].strip()
-        link = urljoin(BASE, href)
-        link = _strip_fragment(link)
-        if not _is_article_link(link):
-            continue
-
-        title = _extract_clean_title(a)
-        if not title:
-            continue
-
-        if link in seen_now:
-            continue
-        seen_now.add(link)
-
-        if link not in seen:
-            out.append((title, link, "DSGNERS"))
-
-    # 2) подстраховка (если вдруг ничего не нашли на текущей разметке)
-    if not out:
-        for a in soup.select("a[href]"):
+    def collect(anchors):
+        for a in anchors:
             href = a["href"].strip()
             link = urljoin(BASE, href)
             link = _strip_fragment(link)
@@ -195,13 +219,128 @@ async def fetch_dsgners(articles=True):
             if link in seen_now:
                 continue
             seen_now.add(link)
+            out.append((title, link))
 
-            if link not in seen:
-                out.append((title, link, "DSGNERS"))
+    # 1) основные карточки: в дерево попадают только <article>
+    cards = make_soup(html, only=_DSGNERS_CARDS_ONLY)
+    collect(_ANCHOR_WITH_HREF.select(cards))
+
+    # 2) подстраховка (если вдруг ничего не нашли на текущей разметке)
+    if not out:
+        collect(make_soup(html, only=_DSGNERS_LINKS_ONLY).find_all("a", href=True))
 
-    save_seen_links(out, SEEN_FILE)
     return out
 
+
+async def fetch_dsgners(articles=True):
+    URL = "https://dsgners.ru/" if articles else "https://dsgners.ru/news"
+    kind = link_store.ARTICLES if articles else link_store.NEWS
+
+    page = await fetch_if_changed(URL)
+    if page is None:
+        return []
+    items = await _parse("dsgners", parse_dsgners, page.body)
+
+    new = link_store.add_links(items, kind)
+    page.commit()
+    return [(title, link, "DSGNERS") for title, link in new]
+
+
+# ---------- параллельный сбор со всех источников ----------
+SOURCES = {
+    "sostav": fetch_sostav,
+    "vc": fetch_vc,
+    "habr": fetch_habr,
+    "dsgners": partial(fetch_dsgners, articles=True),
+    "dsgners_news": partial(fetch_dsgners, articles=False),
+}
+
+
+def _paged(first_page: str, page_template: str | None):
+    """Адрес n-й страницы листинга: первая — обычный адрес, остальные — по шаблону."""
+    def page_url(n: int) -> str | None:
+        if n == 1:
+            return first_page
+        return page_template.format(n=n) if page_template else None
+    return page_url
+
+
+# Обход вглубь для бэкфилла (utils/crawler.py). RSS Хабра не листается —
+# вместо страниц берём одну ленту с максимальным limit
+CRAWL_TARGETS = {
+    "sostav": CrawlTarget(
+        "sostav", link_store.NEWS,
+        _paged("https://www.sostav.ru/news/digital", "https://www.sostav.ru/news/digital/page{n}"),
+        partial(_parse, "sostav", parse_sostav),
+    ),
+    "vc": CrawlTarget(
+        "vc", link_store.ARTICLES,
+        _paged("https://vc.ru/design", "https://vc.ru/design?page={n}"),
+        partial(_parse, "vc", parse_vc),
+    ),
+    "habr": CrawlTarget(
+        "habr", link_store.ARTICLES,
+        _paged("https://habr.com/ru/rss/flows/design/articles/?fl=ru&limit=100", None),
+        partial(_parse, "habr", parse_habr),
+    ),
+    "dsgners": CrawlTarget(
+        "dsgners", link_store.ARTICLES,
+        _paged("https://dsgners.ru/", "https://dsgners.ru/?page={n}"),
+        partial(_parse, "dsgners", parse_dsgners),
+    ),
+    "dsgners_news": CrawlTarget(
+        "dsgners_news", link_store.NEWS,
+        _paged("https://dsgners.ru/news", "https://dsgners.ru/news?page={n}"),
+        partial(_parse, "dsgners", parse_dsgners),
+    ),
+}
+
+
+@dataclass
+class SourceResult:
+    """Итог опроса одного источника."""
+
+    name: str
+    items: list
+    elapsed: float
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def _run_source(name, fetcher, timeout) -> SourceResult:
+    started = time.perf_counter()
+    try:
+        items = await asyncio.wait_for(fetcher(), timeout)
+    except Exception as e:
+        # падение одного источника не должно ронять остальные
+        elapsed = time.perf_counter() - started
+        FETCH_SECONDS.labels(name).observe(elapsed)
+        FETCH_ERRORS.labels(name, type(e).__name__).inc()
+        return SourceResult(name, [], elapsed, e)
+    elapsed = time.perf_counter() - started
+    FETCH_SECONDS.labels(name).observe(elapsed)
+    FETCH_ITEMS.labels(name).inc(len(items))
+    return SourceResult(name, items, elapsed)
+
+
+async def fetch_all_sources(timeout: float = SOURCE_TIMEOUT) -> list[SourceResult]:
+    """
+    Опрашивает все источники одновременно через общую HTTP-сессию.
+    У каждого источника свой таймаут, ошибки изолированы в SourceResult.
+    """
+    return await asyncio.gather(
+        *(_run_source(name, fetcher, timeout) for name, fetcher in SOURCES.items())
+    )
+
+
+async def harvest_source(name: str, timeout: float = SOURCE_TIMEOUT) -> SourceResult:
+    """Опрос одного источника для фонового сбора (см. utils/scheduler.py)."""
+    return await _run_source(name, SOURCES[name], timeout)
+
+
 # async def fetch_all():
 #     sostav = await fetch_sostav()
 #     vc = await fetch_vc()
@@ -232,56 +371,6 @@ async def fetch_dsgners(articles=True):
 #                 await bot.send_message("68086662", str(e))
 
 
-ARTICLES_FILE = "links.txt"
-NEWS_FILE = "links_news.txt"
-SENT_ART_FILE = "sent_articles.txt"
-SENT_NEWS_FILE = "sent_news.txt"
-
-def _read_archive(path):
-    """Читает архив: строки вида 'Title — https://link' -> [(title, link), ...]."""
-    if not os.path.exists(path):
-        return []
-    out = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if " — " not in line:
-                continue
-            title, link = line.rsplit(" — ", 1)
-            title = title.strip().strip("[]").strip()
-            link = link.strip()
-            if title and link:
-                out.append((title, link))
-    # уберём дубли по ссылке (оставляя первый заголовок)
-    seen = set()
-    uniq = []
-    for t, l in out:
-        if l not in seen:
-            uniq.append((t, l))
-            seen.add(l)
-    return uniq
-
-def _read_sent_set(path: str) -> set[str]:
-    """Читает историю отправленных ссылок (по ссылке)."""
-    if not os.path.exists(path):
-        return set()
-    sent = set()
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if " — " in line:
-                _, link = line.rsplit(" — ", 1)
-                sent.add(link.strip())
-    return sent
-
-def _append_sent(path: str, chosen: list[tuple[str, str]]) -> None:
-    """Добавляет выбранные (title, link) в историю отправленных."""
-    if not chosen:
-        return
-    with open(path, "a", encoding="utf-8") as f:
-        for title, link in chosen:
-            f.write(f"{title} — {link}\n")
-
 def _source_from_url(link: str) -> str:
     host = urlparse(link).netloc.lower()
     if "vc.ru" in host:       return "VC"
@@ -290,138 +379,293 @@ def _source_from_url(link: str) -> str:
     if "dsgners.ru" in host:  return "Dsgners"
     return host or "web"
 
-def _pick_random_without_repeats(archive_path: str, sent_path: str, n: int) -> list[tuple[str, str, str]]:
+RESERVOIR_SLACK = 2  # резервуар больше квоты — запас на отсев почти-дубликатов
+
+
+def _pick_candidates(kind: str, n_each: int, taken: list | None = None) -> list[tuple[str, str, str]]:
     """
-    Берём из архива N случайных (title, link, source), которых нет в истории.
-    Если unseen < N — вернём сколько есть (повторов не будет).
+    Один проход по непросланным: на каждый источник — взвешенная резервуарная
+    выборка (A-Res) с весом по свежести публикации, память O(n_each) на
+    источник при любом размере архива. Квота — не больше n_each от источника.
+    Порядок — по кругу: лучший материал каждого источника, потом вторые и т.д.,
+    внутри круга — по ключу выборки. Из этого общего пула любой вариант
+    дайджеста (с любыми отключёнными источниками) набирает свои n_each.
+    taken — (источник, шинглы) уже отобранного (общие для всех разделов):
+    одна и та же история с разных источников попадёт в дайджест один раз.
     """
-    all_items = _read_archive(archive_path)
-    sent = _read_sent_set(sent_path)
-    unseen = [(t, l) for (t, l) in all_items if l not in sent]
-
-    if not unseen:
-        return []
+    now = time.time()
+    reservoirs: dict[str, WeightedReservoir] = {}
+    for title, link, source, published_at in link_store.iter_unsent(kind):
+        reservoir = reservoirs.get(source)
+        if reservoir is None:
+            reservoir = reservoirs[source] = WeightedReservoir(n_each * RESERVOIR_SLACK)
+        reservoir.offer((title, link, source), recency_weight(published_at, now))
+
+    taken = [] if taken is None else taken
+    ranked = sorted(
+        (entry for reservoir in reservoirs.values() for entry in reservoir.ranked()),
+        key=lambda entry: entry[0], reverse=True,
+    )
+    per_source = defaultdict(list)
+    for key, (title, link, source) in ranked:
+        if len(per_source[source]) >= n_each:
+            continue
+        tokens = near_dup.index_shingles(title)
+        if tokens is not None:
+            if any(other_source != source and near_dup.is_near(tokens, other) for other_source, other in taken):
+                continue
+            taken.append((source, tokens))
+        per_source[source].append((key, (title, link, source)))
 
-    if len(unseen) > n:
-        unseen = random.sample(unseen, n)
+    out = []
+    for rank in range(n_each):
+        round_ = [picked[rank] for picked in per_source.values() if rank < len(picked)]
+        out.extend(item for _, item in sorted(round_, key=lambda entry: entry[0], reverse=True))
+    return out
 
-    # добавим источник
-    return [(t, l, _source_from_url(l)) for (t, l) in unseen]
 
+def _pick_random_without_repeats(kind: str, n: int) -> list[tuple[str, str, str]]:
+    """
+    Берём из архива до N (title, link, source), которых нет в истории:
+    взвешенная по свежести резервуарная выборка по источникам, без
+    почти-дубликатов с других источников, по кругу между источниками
+    (см. _pick_candidates). Если непросланных меньше N — вернём сколько есть.
+    """
+    return [(t, l, _source_from_url(l)) for (t, l, _) in _pick_candidates(kind, n)[:n]]
 
-def _safe_remove(path: str):
-    try:
-        if os.path.exists(path):
-            os.remove(path)
-    except Exception:
-        # не падаем из-за файловой ошибки
-        pass
 
 # ---------- сбор дайджеста ----------
+DIGEST_SECTIONS = (
+    (link_store.ARTICLES, "✏️ <b>Статьи</b>\n", "Новых статей пока нет."),
+    (link_store.NEWS, "\n\n📰 <b>Новости</b>\n", "Новых новостей пока нет."),
+)
+
+
+@lru_cache(maxsize=1024)
+def _render_item(title: str, link: str) -> str:
+    """Готовый HTML одной строки дайджеста (без номера) — общий для всех вариантов."""
+    return f'<a href="{link}">{title}</a> — {_source_from_url(link)}'
+
+
+class DigestPool:
+    """
+    Отобранные на сегодня материалы и все варианты дайджеста из них.
+    Вариант определяется набором отключённого (источники/разделы) и
+    рендерится один раз на набор, сколько бы подписчиков его ни получало.
+    """
+
+    def __init__(self, n_each: int = 5, candidates: dict | None = None):
+        self.n_each = n_each
+        if candidates is None:
+            taken = []
+            with stage("select"):
+                candidates = {kind: _pick_candidates(kind, n_each, taken) for kind, _, _ in DIGEST_SECTIONS}
+        self.candidates = candidates
+        # что реально попало хоть в один вариант — это и пишем в историю
+        self.used = {kind: {} for kind, _, _ in DIGEST_SECTIONS}
+        self._variants: dict[frozenset, str] = {}
+
+    def select(self, kind: str, excluded: frozenset = frozenset()) -> list[tuple[str, str, str]]:
+        return [c for c in self.candidates[kind] if c[2] not in excluded][:self.n_each]
+
+    def render(self, excluded: frozenset = frozenset()) -> str:
+        if excluded in self._variants:
+            return self._variants[excluded]
+        with stage("render"):
+            return self._render(excluded)
+
+    def _render(self, excluded: frozenset) -> str:
+        parts = []
+        for kind, header, empty in DIGEST_SECTIONS:
+            if kind in excluded:
+                continue
+            parts.append(header)
+            items = self.select(kind, excluded)
+            if items:
+                for i, (title, link, _) in enumerate(items, 1):
+                    parts.append(f"{i}. {_render_item(title, link)}")
+                    self.used[kind][link] = title
+            else:
+                parts.append(empty)
+
+        html = "\n".join(parts).lstrip()
+        html += "\n\n#DigitalDigest"
+        self._variants[excluded] = html
+        return html
+
+    def chosen(self, kind: str) -> list[tuple[str, str]]:
+        """(title, link), отправленные хотя бы в одном варианте."""
+        return [(title, link) for link, title in self.used[kind].items()]
+
+    @property
+    def variants(self) -> int:
+        return len(self._variants)
+
+    def payload(self) -> dict:
+        """Всё, что нужно, чтобы после перезапуска собрать те же самые варианты."""
+        return {
+            "n_each": self.n_each,
+            "candidates": self.candidates,
+            "variants": [dump_excluded(excluded) for excluded in self._variants],
+        }
+
+    @classmethod
+    def restore(cls, payload: dict) -> "DigestPool":
+        candidates = {kind: [tuple(c) for c in items] for kind, items in payload["candidates"].items()}
+        pool = cls(payload["n_each"], candidates)
+        for key in payload["variants"]:
+            pool.render(parse_excluded(key))  # рендер детерминирован: тот же текст, тот же used
+        return pool
+
+    def all_chosen(self) -> dict[str, list[tuple[str, str]]]:
+        return {kind: self.chosen(kind) for kind, _, _ in DIGEST_SECTIONS}
+
+
 def build_daily_digest(n_each: int = 5) -> tuple[str, list[tuple[str,str]], list[tuple[str,str]]]:
     """
     Возвращает:
-      - готовый HTML-текст,
+      - готовый HTML-текст (полный вариант, без отключённых источников),
       - список выбранных статей [(title, link), ...],
       - список выбранных новостей [(title, link), ...]
     Эти списки нужны, чтобы записать их в историю отправленных ПОСЛЕ успешной отправки.
     """
-    arts  = _pick_random_without_repeats(ARTICLES_FILE, SENT_ART_FILE, n_each)
-    news  = _pick_random_without_repeats(NEWS_FILE,     SENT_NEWS_FILE, n_each)
-
-    parts = []
-    parts.append("✏️ <b>Статьи</b>\n")
-    if arts:
-        for i, (title, link, source) in enumerate(arts, 1):
-            parts.append(f'{i}. <a href="{link}">{title}</a> — {source}')
-    else:
-        parts.append("Новых статей пока нет.")
-
-    parts.append("\n\n📰 <b>Новости</b>\n")
-    if news:
-        for i, (title, link, source) in enumerate(news, 1):
-            parts.append(f'{i}. <a href="{link}">{title}</a> — {source}')
-    else:
-        parts.append("Новых новостей пока нет.")
-
-    html = "\n".join(parts)
-    html += "\n\n#DigitalDigest"
-    # вернём пары без source, чтобы писать в историю
-    chosen_articles = [(t, l) for (t, l, _) in arts]
-    chosen_news = [(t, l) for (t, l, _) in news]
-    return html, chosen_articles, chosen_news
+    pool = DigestPool(n_each)
+    html = pool.render()
+    return html, pool.chosen(link_store.ARTICLES), pool.chosen(link_store.NEWS)
 
 # ---------- ежедневная задача ----------
-async def send_daily_digest(bot, chat_ids, n_each=5):
+async def _report_broadcast(bot, stats):
     """
-    1) обновляем архивы парсером (твои функции), чтобы пополнялись links*.txt
-    2) собираем дайджест без повторов
-    3) шлём всем chat_ids
-    4) при успехе дописываем отправленные ссылки в историю
+    Одно итоговое сообщение админу вместо сообщения на каждую ошибку:
+    итоги рассылки и ошибки, сгруппированные по типу (см. utils/failures.py).
     """
-    try:
-        await fetch_sostav()
-        await fetch_vc()
-        await fetch_habr()
-        await fetch_dsgners(articles=True)
-        await fetch_dsgners(articles=False)
-    except Exception:
-        # если парсинг упал — всё равно попробуем собрать из уже накопленных файлов
-        pass
+    failures = FailureAggregator("Рассылка")
+    for chat_id, error, dead in stats.failures:
+        kind, _, message = error.partition(": ")
+        failures.add("отключённые чаты" if dead else "отправка", kind, message, chat_id)
+    await failures.report(bot, header=stats.summary())
+
 
-    html, chosen_articles, chosen_news = build_daily_digest(n_each=n_each)
+async def send_daily_digest(bot, subscribers, n_each=5, exclusions=(frozenset(),), dry_run=False):
+    """
+    1) если прошлая рассылка прервалась (процесс убили) — продолжаем её:
+       тот же дайджест из записи рассылки, уже обработанные чаты пропускаем;
+       иначе собираем дайджест без повторов из архива, который заранее
+       наполняет фоновый сбор (harvest-задачи в utils/scheduler.py)
+    2) варианты для наборов отключённого из exclusions рендерим сразу и вместе
+       с записью рассылки одной транзакцией пишем их ссылки в историю
+    3) шлём подписчикам по мере того, как они читаются из БД; subscribers —
+       пары (chat_id, excluded), список или асинхронный итератор. Каждый чат
+       отмечается в журнале рассылки сразу после отправки
+    4) отключаем мёртвые чаты, закрываем рассылку
+    dry_run — холостой прогон (для профилирования): отбор, рендер и обход
+    подписчиков как обычно, но без отправки, без лимита скорости и без
+    записей в историю, журнал рассылки и таблицу подписчиков.
+    Возвращает статистику рассылки.
+    """
+    record = None if dry_run else link_store.unfinished_broadcast()
+    if record is not None:
+        broadcast_id, payload = record
+        pool = DigestPool.restore(payload)
+        logger.warning(f"Продолжаем прерванную рассылку #{broadcast_id}")
+    else:
+        with DIGEST_BUILD_SECONDS.time():
+            pool = DigestPool(n_each)
+            for excluded in exclusions:
+                pool.render(excluded)
+        broadcast_id = None if dry_run else link_store.start_broadcast(pool.payload(), pool.all_chosen())
 
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     image_path = os.path.join(BASE_DIR, "bot_cover.png")
-    print(image_path)
+    logger.debug(f"Обложка дайджеста: {image_path}")
 
-    for chat_id in chat_ids:
-        try:
-            if os.path.exists(image_path):
-                photo = FSInputFile(image_path)
-                await bot.send_photo(
-                    chat_id,
-                    photo=photo,
-                    caption=html,
-                    parse_mode="HTML"
-                )
-            else:
-                await bot.send_message(chat_id, html, parse_mode="HTML", disable_web_page_preview=True)
+    has_image = os.path.exists(image_path)
 
+    async def send_one(target):
+        chat_id, html = target
+        if dry_run:
+            return
+        if has_image:
+            await media_cache.send_photo(
+                bot,
+                chat_id,
+                image_path,
+                caption=html,
+                parse_mode="HTML"
+            )
+        else:
+            await bot.send_message(chat_id, html, parse_mode="HTML", disable_web_page_preview=True)
+
+    def on_done(target, error):
+        link_store.record_delivery(broadcast_id, target[0], error is None)
+
+    async def targets():
+        async for chat_id, excluded in aiterate(subscribers):
+            if record is not None and link_store.is_delivered(broadcast_id, chat_id):
+                continue
+            yield chat_id, pool.render(excluded)
+
+    with stage("send"):
+        stats = await broadcast(
+            targets(), send_one,
+            chat_id_of=lambda target: target[0],
+            on_done=None if dry_run else on_done,
+            rate=float("inf") if dry_run else None,
+            metrics=not dry_run,
+        )
+    if dry_run:
+        return stats
+    # варианты, впервые понадобившиеся по ходу рассылки, тоже уходят в историю
+    link_store.finish_broadcast(broadcast_id, pool.all_chosen())
+    if not stats.total:
+        return stats
+    logger.info(f"Вариантов дайджеста: {pool.variants}")
+    await _report_broadcast(bot, stats)
+    if stats.failures:
+        try:
+            # заблокировавшие бота и удалённые чаты больше не попадут в рассылку
+            await record_failures(stats.failures)
         except Exception as e:
-            await bot.send_message("68086662", str(e))
-            continue
+            logger.error(f"Не удалось сохранить ошибки рассылки: {e}")
+
+    return stats
 
-    # 4) фиксируем «уже отправленные», чтобы не повторять в будущем
-    _append_sent(SENT_ART_FILE, chosen_articles)
-    _append_sent(SENT_NEWS_FILE, chosen_news)
 
-    _safe_remove(ARTICLES_FILE)
-    _safe_remove(NEWS_FILE)
+_digest_lock = asyncio.Lock()
 
 
-async def daily_digest_job(n_each: int = 5):
+async def daily_digest_job(n_each: int = 5, dry_run: bool = False):
     """
-    Достаёт chat_ids из БД и шлёт дайджест без повторов.
+    Шлёт дайджест без повторов, читая подписчиков из БД постранично:
+    рассылка начинается с первой страницы, а не после загрузки всей таблицы.
+    Она же продолжает прерванную рассылку после перезапуска.
+    dry_run — холостой прогон без отправки (см. send_daily_digest). Он ничего
+    не пишет и идёт мимо _digest_lock: иначе /profile около 11:00 заставил бы
+    настоящую рассылку пропустить запуск.
+    Возвращает статистику рассылки (None — рассылки не было).
     """
-    try:
-        rows = await all_users()  # ожидается список dict с ключом "telegram_id"
-        # Соберём уникальные и валидные chat_id
-        chat_ids = []
-        seen = set()
-        for r in rows:
-            tid = r.get("telegram_id")
-            if not tid:
-                continue
-            # в твоём коде местами строки — приведём к int/str, Телеграм терпит оба
-            tid_str = str(tid).strip()
-            if not tid_str or tid_str in seen:
-                continue
-            seen.add(tid_str)
-            chat_ids.append(tid_str)
+    if dry_run:
+        return await _run_daily_digest(n_each, dry_run=True)
+    if _digest_lock.locked():
+        logger.warning("Рассылка уже идёт — пропускаем запуск")
+        return
+    async with _digest_lock:
+        return await _run_daily_digest(n_each)
 
-        if not chat_ids:
+
+async def _run_daily_digest(n_each: int, dry_run: bool = False):
+    try:
+        exclusions = {parse_excluded(raw) for raw in await active_exclusions()}
+        if not exclusions:
             return
-        await send_daily_digest(bot, chat_ids, n_each=n_each)
+        subscribers = (
+            (chat_id, parse_excluded(excluded))
+            async for chat_id, excluded in iter_subscribers()
+        )
+        return await send_daily_digest(bot, subscribers, n_each=n_each, exclusions=exclusions, dry_run=dry_run)
     except Exception as e:
-        print(e)
\ No newline at end of file
+        logger.exception("Ежедневный дайджест упал")
+        failures = FailureAggregator("Ежедневный дайджест")
+        failures.add_error("задача", e)
+        # падение задачи — каждый раз, мимо дедупа: иначе завтрашний такой же сбой промолчит
+        await failures.report(bot, header="Ежедневный дайджест не отправлен", force=True)
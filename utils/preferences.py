@@ -0,0 +1,31 @@
+from utils.link_store import ARTICLES, NEWS
+
+
+# Что подписчик может отключить: источники и разделы дайджеста
+PREF_SOURCES = {"vc": "VC", "habr": "Habr", "sostav": "Sostav", "dsgners": "Dsgners"}
+PREF_KINDS = {ARTICLES: "Статьи", NEWS: "Новости"}
+
+
+def parse_excluded(raw: str | None) -> frozenset[str]:
+    """Строка из users.excluded ('habr,news') -> множество отключённого."""
+    if not raw:
+        return frozenset()
+    return frozenset(key for key in raw.split(",") if key in PREF_SOURCES or key in PREF_KINDS)
+
+
+def dump_excluded(excluded) -> str:
+    """Каноническая строка для БД: одинаковые наборы дают одинаковый ключ группы."""
+    return ",".join(sorted(excluded))
+
+
+def toggle(excluded: frozenset[str], key: str) -> frozenset[str]:
+    """
+    Включает/выключает key. Последний источник или последний раздел
+    выключить нельзя — иначе дайджест был бы пустым.
+    """
+    if key in excluded:
+        return excluded - {key}
+    updated = excluded | {key}
+    if set(PREF_SOURCES) <= updated or set(PREF_KINDS) <= updated:
+        return excluded
+    return updated
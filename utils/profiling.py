@@ -0,0 +1,163 @@
+"""
+Профилирование ежедневной задачи: почему рассылка в 11:00 была медленной.
+
+Прогон daily_digest_job (по умолчанию — холостой, без отправки, без записи
+в историю и мимо метрик Prometheus) под cProfile плюс время по этапам:
+fetch, parse, select, render, send. Пик памяти (tracemalloc) меряется только
+в холостом прогоне: tracemalloc замедляет каждое выделение памяти, а
+настоящая рассылка идёт в живом процессе полчаса. cProfile тоже замедляет
+рассылку с отправкой (порядка десятков процентов по CPU) — её профилируют,
+когда это осознанно нужно. Этапы размечены в коде через stage() — вне прогона
+разметка ничего не стоит. Итог — текстовый отчёт и .prof (формат pstats:
+snakeviz, `flameprof digest.prof > digest.svg`) в PROFILE_DIR; админ
+получает их через /profile.
+
+    python -m utils.profiling                 # холостой прогон
+    python -m utils.profiling --send          # настоящая рассылка
+    python -m utils.profiling --harvest --top 40
+"""
+import argparse
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+
+
+PROFILE_DIR = "profiles"
+PROFILE_TOP = 25  # сколько функций показывать в отчёте
+STAGES = ("fetch", "parse", "select", "render", "send")
+
+# [секунд, вызовов] по этапам текущего прогона; None — профилирование не идёт.
+# Задачи и to_thread наследуют контекст, поэтому словарь общий на весь прогон
+_stages: ContextVar[dict | None] = ContextVar("profiling_stages", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Отмечает участок как этап name. Параллельные вызовы суммируются."""
+    timings = _stages.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = timings[name]
+        entry[0] += time.perf_counter() - started
+        entry[1] += 1
+
+
+@dataclass
+class ProfileReport:
+    dry_run: bool
+    wall: float = 0.0
+    peak_memory: int | None = None
+    stages: dict = field(default_factory=dict)
+    summary: str = ""
+    top: str = ""
+    text_path: str = ""
+    prof_path: str = ""
+
+    def render(self) -> str:
+        lines = [
+            f"Профиль дайджеста ({'холостой прогон' if self.dry_run else 'с отправкой'})",
+            f"Всего: {self.wall:.2f} c, пик памяти (tracemalloc): "
+            + (f"{self.peak_memory / 2 ** 20:.1f} МБ" if self.peak_memory is not None else "не замерялся"),
+        ]
+        if self.summary:
+            lines.append(self.summary)
+        lines.append("Этапы (сумма по вызовам, параллельные перекрываются):")
+        for name in (*STAGES, *sorted(set(self.stages) - set(STAGES))):
+            seconds, calls = self.stages.get(name, (0.0, 0))
+            lines.append(f"  {name:<7} {seconds:8.3f} c  × {calls}")
+        return "\n".join(lines)
+
+
+async def profile_digest(
+    *, dry_run: bool = True, harvest: bool = False, out_dir: str = PROFILE_DIR, top: int = PROFILE_TOP,
+) -> ProfileReport:
+    """
+    harvest — сначала опросить источники (этапы fetch и parse): сама задача
+    рассылки берёт материалы из архива, который наполняет фоновый сбор.
+    Опрос пишет ссылки и валидаторы в архив, поэтому в боте он разрешён
+    только ведущему (см. handlers/profile.py). Разбор идёт в потоках —
+    cProfile его не видит, время есть в этапе parse.
+    """
+    from utils.parser import daily_digest_job, fetch_all_sources
+
+    report = ProfileReport(dry_run=dry_run)
+    token = _stages.set(defaultdict(lambda: [0.0, 0]))
+    profiler = cProfile.Profile()
+    if dry_run:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            if harvest:
+                await fetch_all_sources()
+            stats = await daily_digest_job(dry_run=dry_run)
+        finally:
+            profiler.disable()
+            report.wall = time.perf_counter() - started
+            if dry_run:
+                report.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            report.stages = {name: tuple(value) for name, value in _stages.get().items()}
+    finally:
+        _stages.reset(token)
+
+    report.summary = stats.summary() if stats is not None else "Рассылки не было"
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+    report.top = out.getvalue()
+
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"digest-{datetime.now():%Y%m%d-%H%M%S}")
+    report.prof_path = f"{base}.prof"
+    report.text_path = f"{base}.txt"
+    profiler.dump_stats(report.prof_path)
+    with open(report.text_path, "w", encoding="utf-8") as f:
+        f.write(f"{report.render()}\n\n{report.top}")
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--send", action="store_true", help="настоящая рассылка, а не холостой прогон")
+    ap.add_argument("--harvest", action="store_true", help="сначала опросить источники (этапы fetch и parse)")
+    ap.add_argument("--out", default=PROFILE_DIR, help="каталог для отчёта и .prof")
+    ap.add_argument("--top", type=int, default=PROFILE_TOP, help="сколько функций показать в отчёте")
+    args = ap.parse_args(argv)
+
+    async def run():
+        from loader import bot
+        from pg_maker import close_pool
+        from utils.http_client import close_session
+
+        try:
+            return await profile_digest(
+                dry_run=not args.send, harvest=args.harvest, out_dir=args.out, top=args.top,
+            )
+        finally:
+            await close_session()
+            await close_pool()
+            await bot.session.close()
+
+    report = asyncio.run(run())
+    print(report.render())
+    print(report.top)
+    print(f"Отчёт: {report.text_path}\nПрофиль: {report.prof_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import asyncio
+
+from pg_maker import add_users
+
+
+REGISTRATION_BATCH_SIZE = 200      # набралось столько новых id — пишем сразу
+REGISTRATION_FLUSH_INTERVAL = 2.0  # иначе — не реже чем раз в столько секунд
+
+
+class RegistrationBuffer:
+    """
+    Отложенная запись подписчиков из /start. register() ничего не ждёт:
+    id копится в буфере и уходит в users пачкой — по размеру или по таймеру,
+    остаток — при остановке. Если запись не удалась, пачка возвращается в
+    буфер до следующей попытки. Кэша «уже записанных» нет: чат могла отключить
+    рассылка в другом процессе, и каждый /start должен дойти до БД, чтобы
+    включить его обратно (для активных upsert в add_users ничего не пишет).
+    """
+
+    def __init__(self, batch_size: int = REGISTRATION_BATCH_SIZE,
+                 flush_interval: float = REGISTRATION_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: set[str] = set()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._flushes: set[asyncio.Task] = set()
+
+    def register(self, telegram_id: str) -> None:
+        self._pending.add(telegram_id)
+        if len(self._pending) >= self.batch_size and not self._flushes:
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def flush(self) -> int:
+        """Пишет накопленное одной пачкой; возвращает, сколько id записано."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, set()
+            try:
+                await add_users(batch)
+            except Exception as e:
+                self._pending |= batch
+                print(f"registrations: не удалось записать {len(batch)} id: {e}")
+                return 0
+            return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает таймер и дописывает всё, что осталось в буфере."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
+
+
+registrations = RegistrationBuffer()
@@ -0,0 +1,41 @@
+import heapq
+import math
+import random
+
+
+# Свежесть: вес материала падает вдвое за каждые RECENCY_HALF_LIFE секунд
+RECENCY_HALF_LIFE = 24 * 60 * 60
+
+
+def recency_weight(published_at: float, now: float, half_life: float = RECENCY_HALF_LIFE) -> float:
+    return 0.5 ** (max(now - published_at, 0.0) / half_life)
+
+
+class WeightedReservoir:
+    """
+    Взвешенная резервуарная выборка A-Res (Efraimidis–Spirakis): k элементов
+    из потока любой длины за один проход, вероятность попасть в выборку
+    пропорциональна весу. Память — O(k): куча из k лучших ключей u^(1/w).
+    """
+
+    def __init__(self, k: int, rnd: random.Random | None = None):
+        self.k = k
+        self._rnd = rnd or random
+        self._heap: list[tuple[float, int, object]] = []
+        self._seen = 0
+
+    def offer(self, item, weight: float) -> None:
+        if weight <= 0 or self.k <= 0:
+            return
+        # log(u^(1/w)) = log(u)/w — тот же порядок ключей без underflow при малых w
+        key = math.log(1.0 - self._rnd.random()) / weight
+        self._seen += 1
+        entry = (key, self._seen, item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def ranked(self) -> list[tuple[float, object]]:
+        """(ключ, элемент) от лучшего к худшему."""
+        return [(key, item) for key, _, item in sorted(self._heap, reverse=True)]
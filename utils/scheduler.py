@@ -1,10 +1,139 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import asyncio
 import atexit
+import time
 import pytz
 
-from .parser import daily_digest_job
+from . import link_store
+from .failures import FailureAggregator
+
+
+# Фоновый сбор: каждый источник опрашивается по своему интервалу,
+# который подстраивается под то, как часто там выходят материалы
+HARVEST_START_INTERVAL = 30 * 60
+HARVEST_MIN_INTERVAL = 10 * 60
+HARVEST_MAX_INTERVAL = 3 * 60 * 60
+HARVEST_TARGET_NEW = 3      # сколько новых материалов хотим получать за один опрос
+HARVEST_SMOOTHING = 0.3     # вес последнего опроса в скользящей оценке темпа публикаций
+HARVEST_STAGGER = 20        # разносим первые опросы источников по времени, секунд
+HARVEST_FIRST_DELAY = 30    # первый опрос — не сразу: сначала бот должен начать отвечать
+# ключи utils.parser.SOURCES: сам парсер (bs4, feedparser, ...) грузится
+# при первом опросе, а не при старте бота
+HARVEST_SOURCES = ("sostav", "vc", "habr", "dsgners", "dsgners_news")
+CRAWL_INTERVAL = 6 * 60 * 60  # обход вглубь: подбирает то, что уехало с первых страниц между опросами
+FAILURE_REPORT_INTERVAL = 30 * 60  # как часто проверять, не пора ли слать админу сводку ошибок сбора
+BROADCAST_RESUME_DELAY = 10  # через сколько секунд после старта продолжать прерванную рассылку
+
+
+@dataclass
+class HarvestPace:
+    """Оценка темпа публикаций источника (материалов в секунду) и текущий интервал."""
+
+    interval: float = HARVEST_START_INTERVAL
+    rate: float | None = None
+    last_poll: float | None = None
+
+
+_paces: dict[str, HarvestPace] = {}
+# выполняющиеся сейчас задачи, которые пишут в хранилище или шлют рассылку:
+# потерявший лидерство процесс их отменяет (scheduler.shutdown этого не делает),
+# иначе он продолжит рассылку параллельно с новым ведущим
+_running: set[asyncio.Task] = set()
+# ошибки опроса источников копятся здесь и уходят админу одной сводкой
+harvest_failures = FailureAggregator("Сбор материалов")
+
+
+def _track() -> None:
+    task = asyncio.current_task()
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def cancel_running_jobs() -> None:
+    """Отменяет выполняющиеся задачи и дожидается, пока они остановятся."""
+    tasks = [task for task in _running if not task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def next_interval(pace: HarvestPace, new_items: int, ok: bool, now: float) -> float:
+    """
+    Обновляет pace по итогам опроса и возвращает следующий интервал.
+    Интервал = сколько нужно ждать, чтобы накопилось ~HARVEST_TARGET_NEW материалов.
+    При ошибке — просто удваиваем интервал (backoff).
+    """
+    if not ok:
+        pace.interval = min(pace.interval * 2, HARVEST_MAX_INTERVAL)
+        return pace.interval
+
+    if pace.last_poll is not None:
+        observed = new_items / max(now - pace.last_poll, 1.0)
+        if pace.rate is None:
+            pace.rate = observed
+        else:
+            pace.rate = HARVEST_SMOOTHING * observed + (1 - HARVEST_SMOOTHING) * pace.rate
+    pace.last_poll = now
+
+    if pace.rate:
+        interval = HARVEST_TARGET_NEW / pace.rate
+    else:
+        interval = pace.interval * 1.5
+    pace.interval = min(max(interval, HARVEST_MIN_INTERVAL), HARVEST_MAX_INTERVAL)
+    return pace.interval
+
+
+async def harvest_job(scheduler, name: str):
+    """Опрашивает один источник и переназначает себе следующий запуск."""
+    from .parser import harvest_source
+
+    _track()
+    result = await harvest_source(name)
+    pace = _paces.setdefault(name, HarvestPace())
+    interval = next_interval(pace, len(result.items), result.ok, time.time())
+
+    if not result.ok:
+        harvest_failures.add_error(name, result.error)
+    status = f"{len(result.items)} новых" if result.ok else f"ошибка {type(result.error).__name__}: {result.error}"
+    print(f"harvest {name}: {status} за {result.elapsed:.2f} c, следующий опрос через {interval / 60:.0f} мин")
+
+    scheduler.reschedule_job(f"harvest_{name}", trigger=IntervalTrigger(seconds=interval))
+
+
+async def digest_job():
+    from .parser import daily_digest_job
+
+    _track()
+    await daily_digest_job()
+
+
+async def crawl_job():
+    from .crawler import crawl, format_crawl_report
+    from .parser import CRAWL_TARGETS
+
+    _track()
+    results = await crawl(list(CRAWL_TARGETS.values()))
+    for result in results:
+        if not result.ok:
+            harvest_failures.add_error(result.name, result.error)
+    print(f"crawl:\n{format_crawl_report(results)}")
+
+
+async def failure_report_job():
+    from loader import bot
+
+    await harvest_failures.report(bot)
+
+
+async def maintenance_job():
+    """Раз в сутки: архив и история отправленного не растут дальше окна хранения."""
+    _track()
+    pruned, expired = link_store.compact()
+    print(f"maintenance: из архива удалено {pruned}, из истории {expired}")
 
 
 def tasks_checker():
@@ -12,8 +141,22 @@ def tasks_checker():
     scheduler.start()
     tz = pytz.timezone("Europe/Moscow")
 
+    now = datetime.now(tz)
+    for i, name in enumerate(HARVEST_SOURCES):
+        scheduler.add_job(
+            func=harvest_job,
+            args=[scheduler, name],
+            trigger=IntervalTrigger(seconds=HARVEST_START_INTERVAL),
+            next_run_time=now + timedelta(seconds=HARVEST_FIRST_DELAY + i * HARVEST_STAGGER),
+            id=f"harvest_{name}",
+            name=f"Сбор материалов: {name}",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
     scheduler.add_job(
-        func=daily_digest_job,
+        func=digest_job,
         # trigger=IntervalTrigger(seconds=10),
         trigger=CronTrigger(
             hour=11,
@@ -26,4 +169,41 @@ def tasks_checker():
         replace_existing=True,
     )
 
-    atexit.register(lambda: scheduler.shutdown())
+    if link_store.unfinished_broadcast() is not None:
+        scheduler.add_job(
+            func=digest_job,
+            trigger="date",
+            run_date=now + timedelta(seconds=BROADCAST_RESUME_DELAY),
+            id="resume_digest_job",
+            name="Продолжение прерванной рассылки",
+            replace_existing=True,
+        )
+
+    scheduler.add_job(
+        func=crawl_job,
+        trigger=IntervalTrigger(seconds=CRAWL_INTERVAL),
+        id="crawl_job",
+        name="Обход листингов вглубь",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    scheduler.add_job(
+        func=failure_report_job,
+        trigger=IntervalTrigger(seconds=FAILURE_REPORT_INTERVAL),
+        id="failure_report_job",
+        name="Сводка ошибок сбора админу",
+        replace_existing=True,
+    )
+
+    scheduler.add_job(
+        func=maintenance_job,
+        trigger=CronTrigger(hour=4, minute=30, timezone=tz),
+        id="store_maintenance_job",
+        name="Чистка архива и истории",
+        replace_existing=True,
+    )
+
+    atexit.register(lambda: scheduler.running and scheduler.shutdown())
+    return scheduler